@@ -21,4 +21,11 @@ setuptools.setup(
     packages=setuptools.find_packages(where="src"),
     python_requires=">=3.6",
     tests_require=['pytest'],
+    extras_require={
+        'fast': ['orjson'],
+        'numpy': ['numpy'],
+    },
+    entry_points={
+        'console_scripts': ['stokercloud=stokercloud.exporter:main'],
+    },
 )
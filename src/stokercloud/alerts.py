@@ -0,0 +1,135 @@
+import operator
+import re
+import time
+from stokercloud.controller_data import FIELD_BY_NAME, State
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+DURATION_UNITS = {None: 1, 's': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600}
+# other spellings of the field units, compared case-insensitively
+UNIT_ALIASES = {'%': 'pct', 'c': 'deg', '°c': 'deg', 'kw': 'kwh', 'pa': 'pa'}
+# (written unit, field unit): factor, for thresholds given in another mass unit than the field
+UNIT_CONVERSIONS = {('kg', 'g'): 1000, ('g', 'kg'): 0.001}
+# "smoke_temperature > 250 for 5 min", "state == BLAD_ROZPAL", "hopper_content < 20 kg", "oxygen_current < 5%"
+RULE_PATTERN = re.compile(
+    r'^\s*(?P<field>\w+)\s*(?P<op>>=|<=|==|!=|>|<)\s*(?P<value>[-+]?\d+(?:\.\d+)?|\w+)'
+    r'(?:\s*(?!for\b)(?P<value_unit>[^\s\d][^\s]*))?'
+    r'(?:\s+for\s+(?P<duration>\d+(?:\.\d+)?)\s*(?P<unit>s|sec|min|m|h)?)?\s*$'
+)
+
+
+def normalize_unit(unit):
+    return UNIT_ALIASES.get(unit.lower(), unit.lower())
+
+
+def convert_threshold(field, value, unit):
+    """`value` written in `unit` (None when not given), in the unit of `field`."""
+    if unit is None or field not in FIELD_BY_NAME:
+        return value
+    field_unit = normalize_unit(FIELD_BY_NAME[field].unit.value)
+    written = normalize_unit(unit)
+    if written == field_unit:
+        return value
+    factor = UNIT_CONVERSIONS.get((written, field_unit))
+    if factor is None:
+        raise ValueError("%s is measured in %s, not %s" % (field, FIELD_BY_NAME[field].unit.value, unit))
+    return value * factor
+
+
+class Rule:
+    def __init__(self, field, op, threshold, duration: float = 0, name=None):
+        if field == 'state':
+            if op not in ('==', '!='):
+                raise ValueError("state can only be compared with == or !=")
+            if threshold not in State.__members__:
+                raise ValueError("Unknown state %s" % threshold)
+        elif field not in FIELD_BY_NAME:
+            raise ValueError("Unknown field %s" % field)
+        self.field = field
+        self.op = op
+        self.threshold = threshold
+        self.duration = duration
+        self.name = name if name is not None else '%s %s %s' % (field, op, threshold)
+
+    @classmethod
+    def parse(cls, text, name=None):
+        match = RULE_PATTERN.match(text)
+        if match is None:
+            raise ValueError("Cannot parse rule %r" % text)
+        field, value, unit = match.group('field'), match.group('value'), match.group('value_unit')
+        if field == 'state':
+            if unit is not None:
+                raise ValueError("state takes no unit")
+            threshold = value
+        else:
+            threshold = convert_threshold(field, float(value), unit)
+        duration = float(match.group('duration') or 0) * DURATION_UNITS[match.group('unit')]
+        return cls(field, match.group('op'), threshold, duration, name if name is not None else text.strip())
+
+    def __repr__(self):
+        return 'Rule(%r)' % self.name
+
+
+class AlertPlan:
+    """A set of rules compiled once into per-field checks.
+
+    Each field is read once per snapshot however many rules use it. The plan
+    itself is stateless and can be shared by many boilers; the pending and
+    firing state of every rule lives in the AlertState returned by state().
+    """
+
+    def __init__(self, rules):
+        self.rules = [rule if isinstance(rule, Rule) else Rule.parse(rule) for rule in rules]
+        self.checks = {}
+        for index, rule in enumerate(self.rules):
+            self.checks.setdefault(rule.field, []).append((index, OPERATORS[rule.op], rule.threshold))
+
+    def state(self):
+        return AlertState(self)
+
+
+class AlertState:
+    """Pending and firing state of an AlertPlan's rules for one boiler."""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self._since = [None] * len(plan.rules)
+        self._firing = [False] * len(plan.rules)
+
+    @property
+    def firing(self):
+        return [rule for rule, firing in zip(self.plan.rules, self._firing) if firing]
+
+    def evaluate(self, controller_data, timestamp=None):
+        """Returns the rules that started (True) or stopped (False) firing, as (rule, firing) pairs.
+
+        A rule with a duration fires once its condition has held for that long;
+        a missing reading counts as the condition not being met.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        record = controller_data.to_dict()
+        if 'state' in self.plan.checks:
+            record['state'] = controller_data.state
+        rules, since, firing = self.plan.rules, self._since, self._firing
+        transitions = []
+        for field, checks in self.plan.checks.items():
+            value = record.get(field)
+            for index, compare, threshold in checks:
+                if value is not None and compare(value, threshold):
+                    if since[index] is None:
+                        since[index] = timestamp
+                    if not firing[index] and timestamp - since[index] >= rules[index].duration:
+                        firing[index] = True
+                        transitions.append((rules[index], True))
+                else:
+                    since[index] = None
+                    if firing[index]:
+                        firing[index] = False
+                        transitions.append((rules[index], False))
+        return transitions
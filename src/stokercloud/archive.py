@@ -0,0 +1,256 @@
+import math
+import mmap
+import os
+import struct
+import time
+from array import array
+from stokercloud.controller_data import FIELDS, FIELD_BY_NAME, STATE_BY_VALUE, State
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MAGIC = b'SCAR'
+VERSION = 3
+# magic, version, field count, state count, base timestamp in milliseconds
+HEADER = struct.Struct('<4sHHHq')
+STATE_COUNT = struct.Struct('<H')
+STATE_COUNT_OFFSET = 8
+# room reserved after the field names for the state table, which grows as new states are seen
+STATE_TABLE_SIZE = 4096
+# state codes are stored as a signed byte
+MAX_STATES = 128
+UNKNOWN_STATE = -1
+
+
+def _pack_names(names):
+    out = bytearray()
+    for name in names:
+        encoded = name.encode('utf-8')
+        out += struct.pack('<B', len(encoded)) + encoded
+    return bytes(out)
+
+
+def _unpack_names(buf, offset, count):
+    names = []
+    for _ in range(count):
+        length = buf[offset]
+        names.append(bytes(buf[offset + 1:offset + 1 + length]).decode('utf-8'))
+        offset += 1 + length
+    return names, offset
+
+
+def _record_struct(field_count):
+    # signed 64-bit ms since the base timestamp, state code, one float32 per field
+    return struct.Struct('<qb%df' % field_count)
+
+
+def read_header(buf):
+    magic, version, field_count, state_count, base_ms = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a StokerCloud archive")
+    if version != VERSION:
+        raise ValueError("Unsupported archive version %d" % version)
+    fields, offset = _unpack_names(buf, HEADER.size, field_count)
+    states, _ = _unpack_names(buf, offset, state_count)
+    return fields, states, base_ms, offset + STATE_TABLE_SIZE
+
+
+class ArchiveWriter:
+    """Append snapshots to a compact fixed-schema archive file.
+
+    Each record holds its time in milliseconds since the base timestamp in the
+    header, the state as an index into the state table stored in the header,
+    and every field as a float32 (NaN when missing). A month of 10 second samples of all
+    fields is about 40 MB instead of gigabytes of JSON.
+
+    The state table starts with every State and interns any other state string
+    the first time it is seen, up to MAX_STATES. float32 keeps about seven
+    significant digits, so values read back carry rounding noise: 3.8 is read
+    as 3.799999952316284.
+
+    Reopening an archive appends to it; a partial last record left by a crash
+    is cut off first.
+    """
+
+    def __init__(self, path, fields=None):
+        self.path = path
+        names = [field.name for field in FIELDS] if fields is None else list(fields)
+        self.states = [state.value for state in State]
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with ArchiveReader(path) as reader:
+                if fields is not None and reader.fields != names:
+                    raise ValueError("Archive %s has a different field schema" % path)
+                names, self.states = reader.fields, reader.states
+                self._base_ms = reader.base_ms
+                self._last_ms = reader.last_ms
+                self._table_offset = reader.records_offset - STATE_TABLE_SIZE
+                end = reader.records_offset + len(reader) * reader.record_size
+            self._file = open(path, 'r+b')
+            self._file.truncate(end)
+            self._file.seek(end)
+            self.fields = [FIELD_BY_NAME[name] for name in names]
+        else:
+            self._file = open(path, 'w+b')
+            self.fields = [FIELD_BY_NAME[name] for name in names]
+            # readers can open the archive before the first record is in
+            self._write_header(int(round(time.time() * 1000)))
+        self._state_codes = {value: code for code, value in enumerate(self.states)}
+        self._record = _record_struct(len(self.fields))
+
+    def _write_header(self, base_ms):
+        header = HEADER.pack(MAGIC, VERSION, len(self.fields), 0, base_ms) + _pack_names(
+            field.name for field in self.fields
+        )
+        self._file.write(header + bytes(STATE_TABLE_SIZE))
+        self._table_offset = len(header)
+        self._write_state_table()
+        self._file.flush()
+        self._base_ms = base_ms
+        self._last_ms = None
+
+    def _write_state_table(self):
+        self._file.seek(self._table_offset)
+        self._file.write(_pack_names(self.states))
+        self._file.seek(STATE_COUNT_OFFSET)
+        self._file.write(STATE_COUNT.pack(len(self.states)))
+        self._file.seek(0, os.SEEK_END)
+
+    def _state_code(self, value):
+        code = self._state_codes.get(value)
+        if code is not None:
+            return code
+        if not isinstance(value, str) or len(self.states) >= MAX_STATES:
+            return UNKNOWN_STATE
+        encoded = value.encode('utf-8')
+        if len(encoded) > 255 or len(_pack_names(self.states)) + 1 + len(encoded) > STATE_TABLE_SIZE:
+            return UNKNOWN_STATE
+        code = self._state_codes[value] = len(self.states)
+        self.states.append(value)
+        self._write_state_table()
+        return code
+
+    def append(self, controller_data, timestamp=None):
+        now_ms = int(round((time.time() if timestamp is None else timestamp) * 1000))
+        if self._last_ms is not None and now_ms < self._last_ms:
+            raise ValueError("Archive records must be appended in time order")
+        record = controller_data.to_dict()
+        values = [record.get(field.name) for field in self.fields]
+        self._file.write(self._record.pack(
+            now_ms - self._base_ms,
+            self._state_code(controller_data.state_pom),
+            *[math.nan if value is None else value for value in values]
+        ))
+        self._last_ms = now_ms
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArchiveReader:
+    """Memory-mapped, read-only access to an archive written by ArchiveWriter.
+
+    Values are float32 widened to float, see ArchiveWriter. States are State
+    members, or the raw state string for states outside State.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.fields, self.states, self.base_ms, self._offset = read_header(self._mmap)
+        self._field_index = {name: index for index, name in enumerate(self.fields)}
+        self._record = _record_struct(len(self.fields))
+        # a partial record at the end, torn by a crash, is not counted
+        self._count = (len(self._mmap) - self._offset) // self._record.size
+        self._times = None
+
+    @property
+    def records_offset(self):
+        return self._offset
+
+    @property
+    def record_size(self):
+        return self._record.size
+
+    def __len__(self):
+        return self._count
+
+    def _records(self):
+        end = self._offset + self._count * self._record.size
+        view = memoryview(self._mmap)[self._offset:end]
+        records = self._record.iter_unpack(view)
+        try:
+            yield from records
+        finally:
+            # drop the exported buffer so the mmap can be closed
+            del records
+            view.release()
+
+    def _state(self, code):
+        if code == UNKNOWN_STATE:
+            return None
+        value = self.states[code]
+        return STATE_BY_VALUE.get(value, value)
+
+    def _structured(self):
+        dtype = numpy.dtype([('time', '<i8'), ('state', 'i1')] + [(name, '<f4') for name in self.fields])
+        return numpy.frombuffer(self._mmap, dtype=dtype, count=self._count, offset=self._offset)
+
+    @property
+    def last_ms(self):
+        """Milliseconds since the epoch of the last record, None when there is none."""
+        if not self._count:
+            return None
+        last = self._offset + (self._count - 1) * self._record.size
+        return self.base_ms + self._record.unpack_from(self._mmap, last)[0]
+
+    def _time_column(self):
+        if self._times is None:
+            self._times = array('q', (record[0] for record in self._records()))
+        return self._times
+
+    def timestamps(self):
+        """Seconds since the epoch of every record."""
+        base_ms = self.base_ms
+        return array('d', ((base_ms + offset) / 1000.0 for offset in self._time_column()))
+
+    def column(self, name):
+        index = self._field_index[name] + 2
+        if numpy is not None:
+            return self._structured()[name].astype(numpy.float64)
+        return array('d', (record[index] for record in self._records()))
+
+    def state_column(self):
+        return [self._state(record[1]) for record in self._records()]
+
+    def records(self):
+        """Yield (timestamp, state, {field: value}) for every record."""
+        base_ms = self.base_ms
+        for record in self._records():
+            values = {
+                name: (None if math.isnan(value) else value)
+                for name, value in zip(self.fields, record[2:])
+            }
+            yield (base_ms + record[0]) / 1000.0, self._state(record[1]), values
+
+    def close(self):
+        self._times = None
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
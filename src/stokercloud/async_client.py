@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import time
+from urllib.parse import urljoin, urlsplit
+from stokercloud.client import Client, TokenInvalid, LOGIN_URL, CONTROLLER_DATA_URL, token_invalid
+from stokercloud.controller_data import ControllerData
+from stokercloud.decoding import loads
+from stokercloud.transport import HTTPError
+
+logger = logging.getLogger(__name__)
+
+
+class _Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+
+    def close(self):
+        self.writer.close()
+
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections shared by any number of AsyncClients.
+
+    `limit` bounds the number of requests in flight across every client using
+    the pool; idle connections are reused until `keepalive_seconds` pass.
+
+    The pool serves one event loop at a time. It can be built outside of a
+    running loop and reused by later loops (e.g. successive asyncio.run()
+    calls); connections left idle by a previous loop are dropped.
+    """
+
+    def __init__(self, limit: int = 20, timeout: float = 30, keepalive_seconds: float = 30):
+        self.limit = limit
+        self.timeout = timeout
+        self.keepalive_seconds = keepalive_seconds
+        self._idle = {}
+        self._semaphore = None
+        self._loop = None
+
+    @property
+    def semaphore(self):
+        # created lazily and per loop: a semaphore and streams are bound to the loop they were used in
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self.close()
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._semaphore
+
+    async def _acquire(self, key):
+        idle = self._idle.get(key, [])
+        while idle:
+            conn = idle.pop()
+            if time.monotonic() - conn.last_used < self.keepalive_seconds and not conn.reader.at_eof():
+                return conn, True
+            conn.close()
+        return await self._acquire_fresh(key)
+
+    def _release(self, key, conn):
+        conn.last_used = time.monotonic()
+        self._idle.setdefault(key, []).append(conn)
+
+    async def request(self, url, headers=None):
+        parts = urlsplit(url)
+        secure = parts.scheme == 'https'
+        key = (parts.hostname, parts.port or (443 if secure else 80), secure)
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+        lines = ['GET %s HTTP/1.1' % target, 'Host: %s' % parts.netloc, 'Connection: keep-alive']
+        for name, value in (headers or {}).items():
+            lines.append('%s: %s' % (name, value))
+        raw_request = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+        async with self.semaphore:
+            conn, reused = await self._acquire(key)
+            try:
+                try:
+                    response = await asyncio.wait_for(self._exchange(conn, raw_request), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    if not reused:
+                        raise
+                    # the server closed an idle connection, retry once on a fresh one
+                    conn.close()
+                    conn, reused = await self._acquire_fresh(key)
+                    response = await asyncio.wait_for(self._exchange(conn, raw_request), self.timeout)
+            except BaseException:
+                conn.close()
+                raise
+            status, response_headers, body = response
+            if response_headers.get('connection', '').lower() == 'close':
+                conn.close()
+            else:
+                self._release(key, conn)
+            return status, response_headers, body
+
+    async def _acquire_fresh(self, key):
+        host, port, secure = key
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=secure or None), self.timeout
+        )
+        return _Connection(reader, writer), False
+
+    async def _exchange(self, conn, raw_request):
+        conn.writer.write(raw_request)
+        await conn.writer.drain()
+        status_line = await conn.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed by server")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await conn.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await conn.reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await conn.reader.readline()
+                    break
+                chunks.append(await conn.reader.readexactly(size))
+                await conn.reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await conn.reader.readexactly(int(headers['content-length']))
+        else:
+            body = await conn.reader.read()
+            headers['connection'] = 'close'
+        return status, headers, body
+
+    def close(self):
+        # transports of a closed loop cannot be closed any more, only forgotten
+        if self._loop is None or not self._loop.is_closed():
+            for idle in self._idle.values():
+                for conn in idle:
+                    conn.close()
+        self._idle.clear()
+
+
+class AsyncClient:
+    BASE_URL = Client.BASE_URL
+
+    def __init__(self, name: str, password: str = None, cache_time_seconds: int = 10, pool: ConnectionPool = None):
+        self.name = name
+        self.password = password
+        self.token = None
+        self.state = None
+        self.last_fetch = None
+        self.cache_time_seconds = cache_time_seconds
+        self.pool = pool if pool is not None else ConnectionPool()
+        self._locks = {}
+        self._locks_loop = None
+
+    def _lock(self, name):
+        # asyncio locks are bound to a loop, keep one set per running loop like ConnectionPool
+        loop = asyncio.get_running_loop()
+        if loop is not self._locks_loop:
+            self._locks = {}
+            self._locks_loop = loop
+        lock = self._locks.get(name)
+        if lock is None:
+            lock = self._locks[name] = asyncio.Lock()
+        return lock
+
+    async def get_json(self, url):
+        status, _, body = await self.pool.request(url)
+        if status != 200:
+            raise HTTPError(status, url)
+        return loads(body)
+
+    async def refresh_token(self):
+        data = await self.get_json(urljoin(self.BASE_URL, LOGIN_URL % self.name))
+        self.token = data['token']  # actual token
+        self.state = data['credentials']  # readonly
+
+    async def refresh_token_once(self, stale_token):
+        # single-flight: concurrent callers that saw the same stale token share one login
+        async with self._lock('token'):
+            if self.token is not None and self.token != stale_token:
+                return self.token
+            await self.refresh_token()
+            return self.token
+
+    async def make_request(self, url, *args, **kwargs):
+        token = self.token
+        if token is None:
+            token = await self.refresh_token_once(token)
+        refreshed = False
+        while True:
+            absolute_url = urljoin(
+                self.BASE_URL,
+                "%stoken=%s" % (url, token)
+            )
+            logger.debug(absolute_url)
+            status, _, body = await self.pool.request(absolute_url)
+            data = loads(body) if status == 200 else None
+            if not token_invalid(status, data):
+                if status != 200:
+                    raise HTTPError(status, absolute_url)
+                return data
+            if refreshed:
+                raise TokenInvalid("Token for %s rejected after refresh" % self.name)
+            logger.debug("Token for %s rejected, refreshing", self.name)
+            token = await self.refresh_token_once(token)
+            refreshed = True
+
+    async def update_controller_data(self):
+        self.cached_data = await self.make_request(CONTROLLER_DATA_URL)
+        self.last_fetch = time.time()
+
+    def cache_fresh(self):
+        return self.last_fetch is not None and (time.time() - self.last_fetch) <= self.cache_time_seconds
+
+    async def controller_data(self):
+        if not self.cache_fresh():
+            async with self._lock('data'):
+                # another task may have refreshed while we were waiting
+                if not self.cache_fresh():
+                    await self.update_controller_data()
+        return ControllerData(self.cached_data)
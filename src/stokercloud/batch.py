@@ -0,0 +1,116 @@
+import itertools
+import math
+from array import array
+from stokercloud.controller_data import FIELDS, FIELD_BY_NAME, STATE_BY_VALUE, State
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+NAN = float('nan')
+STATES = list(State)
+STATE_CODES = {state: code for code, state in enumerate(STATES)}
+UNKNOWN_STATE = -1
+
+
+class SnapshotBatch:
+    """Many ControllerData snapshots stored column by column.
+
+    Rows can be different boilers, the same boiler over time, or both; every
+    field is kept in a contiguous array('d') column with NaN for missing
+    readings, and the state as a small integer code into STATES. Columns are
+    returned as NumPy arrays when NumPy is installed.
+    """
+
+    def __init__(self, fields=None):
+        self.fields = tuple(FIELD_BY_NAME[name] for name in fields) if fields is not None else FIELDS
+        self._columns = {field.name: array('d') for field in self.fields}
+        self._states = array('b')
+        self._timestamps = array('d')
+        self.labels = []
+
+    @classmethod
+    def from_snapshots(cls, snapshots, labels=None, fields=None):
+        batch = cls(fields)
+        if labels is None:
+            for controller_data in snapshots:
+                batch.append(controller_data)
+            return batch
+        missing = object()
+        for controller_data, label in itertools.zip_longest(snapshots, labels, fillvalue=missing):
+            if controller_data is missing or label is missing:
+                raise ValueError("Got a different number of labels than snapshots")
+            batch.append(controller_data, label)
+        return batch
+
+    def __len__(self):
+        return len(self._states)
+
+    def append(self, controller_data, label=None, timestamp=None):
+        record = controller_data.to_dict()
+        for name, column in self._columns.items():
+            value = record.get(name)
+            column.append(NAN if value is None else value)
+        state = STATE_BY_VALUE.get(controller_data.state_pom)
+        self._states.append(STATE_CODES[state] if state is not None else UNKNOWN_STATE)
+        self._timestamps.append(NAN if timestamp is None else timestamp)
+        self.labels.append(label)
+
+    def unit(self, name):
+        return FIELD_BY_NAME[name].unit
+
+    def column(self, name):
+        values = self._columns[name]
+        if numpy is not None:
+            return numpy.frombuffer(values, dtype=numpy.float64).copy()
+        return array('d', values)
+
+    def timestamps(self):
+        if numpy is not None:
+            return numpy.frombuffer(self._timestamps, dtype=numpy.float64).copy()
+        return array('d', self._timestamps)
+
+    def state_codes(self):
+        if numpy is not None:
+            return numpy.frombuffer(self._states, dtype=numpy.int8).copy()
+        return array('b', self._states)
+
+    def states(self):
+        return [STATES[code] if code != UNKNOWN_STATE else None for code in self._states]
+
+    def state_counts(self):
+        counts = {}
+        for code in self._states:
+            state = STATES[code] if code != UNKNOWN_STATE else None
+            counts[state] = counts.get(state, 0) + 1
+        return counts
+
+    def _present(self, name):
+        values = self._columns[name]
+        if numpy is not None:
+            view = numpy.frombuffer(values, dtype=numpy.float64)
+            return view[~numpy.isnan(view)]
+        return [value for value in values if not math.isnan(value)]
+
+    def sum(self, name):
+        values = self._present(name)
+        return float(values.sum()) if numpy is not None else math.fsum(values)
+
+    def mean(self, name):
+        values = self._present(name)
+        if not len(values):
+            return None
+        return float(values.mean()) if numpy is not None else math.fsum(values) / len(values)
+
+    def min(self, name):
+        values = self._present(name)
+        if not len(values):
+            return None
+        return float(values.min()) if numpy is not None else min(values)
+
+    def max(self, name):
+        values = self._present(name)
+        if not len(values):
+            return None
+        return float(values.max()) if numpy is not None else max(values)
@@ -0,0 +1,131 @@
+"""Offline benchmarks, run with `pytest src/stokercloud/benchmarks.py`.
+
+Uses pytest-benchmark when it is installed, otherwise a small timing fixture
+that reports the best of a few rounds. Every benchmark replays responses
+recorded from the local stand-in server, so no network access is needed.
+"""
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+
+from stokercloud.client import Client
+from stokercloud.controller_data import ControllerData, FIELDS, get_from_list_by_key
+from stokercloud.decoding import loads
+from stokercloud.ingest import parse_record
+from stokercloud.testing import StandInServer, make_items, sample_payload
+from stokercloud.transport import HTTPTransport, RecordingTransport, ReplayTransport
+
+FLEET_SIZES = [1, 10, 100, 1000]
+PROPERTIES = [field.name for field in FIELDS]
+
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+    class _Benchmark:
+        rounds = 3
+
+        def __call__(self, func, *args, **kwargs):
+            best = None
+            for _ in range(self.rounds):
+                start = time.perf_counter()
+                result = func(*args, **kwargs)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            print("%s: %.6fs" % (func.__name__, best))
+            return result
+
+    @pytest.fixture
+    def benchmark():
+        return _Benchmark()
+
+
+@pytest.fixture(scope='module')
+def recording(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('recording'))
+    with StandInServer() as server:
+        client = Client('boiler', transport=RecordingTransport(HTTPTransport(), directory))
+        client.BASE_URL = server.base_url
+        client.controller_data()
+        client.close()
+    return directory
+
+
+def make_fleet(recording, size):
+    transport = ReplayTransport(recording, ignore=('token', 'user'))
+    return [Client('boiler-%d' % i, cache_time_seconds=0, transport=transport) for i in range(size)]
+
+
+@pytest.mark.parametrize('size', FLEET_SIZES)
+def test_poll_throughput(benchmark, recording, size):
+    fleet = make_fleet(recording, size)
+
+    def poll():
+        return [client.controller_data() for client in fleet]
+
+    assert len(benchmark(poll)) == size
+
+
+@pytest.mark.parametrize('size', FLEET_SIZES)
+def test_snapshot_parsing(benchmark, size):
+    raw = json.dumps(sample_payload()).encode()
+
+    def parse():
+        return [ControllerData(loads(raw)) for _ in range(size)]
+
+    assert len(benchmark(parse)) == size
+
+
+@pytest.mark.parametrize('size', FLEET_SIZES)
+def test_full_property_extraction(benchmark, size):
+    snapshots = [ControllerData(sample_payload()) for _ in range(size)]
+
+    def extract():
+        return [[getattr(cd, name) for name in PROPERTIES] for cd in snapshots]
+
+    assert len(benchmark(extract)) == size
+
+
+class LinearScanControllerData(ControllerData):
+    def get_sub_item(self, submenu, _id):
+        return get_from_list_by_key(self.data[submenu], 'id', _id)
+
+
+@pytest.mark.parametrize('cls', [ControllerData, LinearScanControllerData])
+def test_section_lookup(benchmark, cls):
+    data = sample_payload()
+    # pad the sections so the scan cost is closer to a real installation
+    for section in ('frontdata', 'boilerdata', 'hopperdata'):
+        data[section] = make_items('pad', [('pad-%d' % i, '0') for i in range(50)]) + data[section]
+
+    def extract():
+        cd = cls(data)
+        return [getattr(cd, name) for name in PROPERTIES]
+
+    assert len(benchmark(extract)) == len(PROPERTIES)
+
+
+@pytest.mark.parametrize('size', FLEET_SIZES)
+def test_record_extraction(benchmark, size):
+    snapshots = [ControllerData(sample_payload()) for _ in range(size)]
+
+    def extract():
+        return [cd.to_dict() for cd in snapshots]
+
+    assert len(benchmark(extract)) == size
+
+
+@pytest.fixture(scope='module')
+def process_pool():
+    with ProcessPoolExecutor() as executor:
+        yield executor
+
+
+@pytest.mark.parametrize('size', FLEET_SIZES)
+def test_parallel_record_parsing(benchmark, process_pool, size):
+    raw = json.dumps(sample_payload()).encode()
+
+    def parse():
+        return list(process_pool.map(parse_record, [raw] * size, chunksize=max(1, size // 32)))
+
+    assert len(benchmark(parse)) == size
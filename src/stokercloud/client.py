@@ -1,61 +1,343 @@
-import json
-from http.client import HTTPResponse
-from urllib import request
+import http.client
 from urllib.parse import urljoin
 import logging
+import threading
 import time
-from stokercloud.controller_data import ControllerData
+from stokercloud.controller_data import ControllerData, NotConnectedException, DEFAULT_SCREEN
+from stokercloud.decoding import decode_payload, fingerprint
+from stokercloud.subscription import SubscriptionHub
+from stokercloud.transport import HTTPTransport
 
 logger = logging.getLogger(__name__)
 
+LOGIN_URL = 'v2/dataout2/login.php?user=%s'
+CONTROLLER_DATA_PATH = "v16bckbeta/dataout2/controllerdata2.php?"
+CONTROLLER_DATA_URL = CONTROLLER_DATA_PATH + DEFAULT_SCREEN.query()
+
 
 class TokenInvalid(Exception):
     pass
 
 
+def token_invalid(status, data):
+    if status in (401, 403):
+        return True
+    if isinstance(data, dict):
+        message = data.get('error') or data.get('status') or ''
+        return 'token' in str(message).lower()
+    return False
+
+
 class Client:
     BASE_URL = "http://www.stokercloud.dk/"
 
-    def __init__(self, name: str, password: str = None, cache_time_seconds: int = 10):
+    def __init__(self, name: str, password: str = None, cache_time_seconds: int = 10, transport=None,
+                 timeout: float = 30, token_ttl: float = None, token_refresh_margin: float = 60,
+                 token_cache=None, stale_while_revalidate: bool = False, history=None, sections=None,
+                 screen=None, stats=None, retry=None, circuit_breaker=None, rate_limiter=None,
+                 cache=None):
         self.name = name
         self.password = password
         self.token = None
+        self.token_issued = None
         self.state = None
         self.last_fetch = None
         self.cache_time_seconds = cache_time_seconds
+        # pass transport=UrllibTransport() to open a fresh connection per request
+        self.transport = transport if transport is not None else HTTPTransport(timeout=timeout)
+        # when the token lifetime is known, refresh it token_refresh_margin seconds before expiry
+        self.token_ttl = token_ttl
+        self.token_refresh_margin = token_refresh_margin
+        self.token_cache = token_cache
+        self._token_lock = threading.Lock()
+        # serve the expired snapshot while a single background refresh runs
+        self.stale_while_revalidate = stale_while_revalidate
+        self._data_lock = threading.Lock()
+        self.history = history
+        # e.g. controller_data.SECTIONS to drop the parts of the payload ControllerData never reads
+        self.sections = sections
+        # a controller_data.Screen to request fewer boxes than DEFAULT_SCREEN
+        self.screen = screen
+        # a stats.ClientStats, may be shared between clients
+        self.stats = stats
+        # resilience.RetryPolicy, CircuitBreaker (see resilience.breaker_for) and TokenBucket
+        self.retry = retry
+        self.circuit_breaker = circuit_breaker
+        self.rate_limiter = rate_limiter
+        # a shared_cache.SharedCache, so processes on one host fetch each account once per interval
+        self.cache = cache
+        self._subscriptions = None
+        # validators of the last decoded payload, an unchanged response skips decoding
+        self.etag = None
+        self.fingerprint = None
+        self.raw_data = None
+        self._snapshot = None
+        # outcome of the last refresh, a background refresh failure is not raised anywhere else
+        self.last_refresh = None
+        self.last_refresh_error = None
 
-    def refresh_token(self):
-        with request.urlopen(
-                urljoin(
-                    self.BASE_URL,
-                    'v2/dataout2/login.php?user=%s' % self.name
-                )
-        ) as response:
-            data = json.loads(response.read())
-            self.token = data['token']  # actual token
-            self.state = data['credentials']  # readonly
-
-    def make_request(self, url, *args, **kwargs):
+    def request(self, url, kind='request', headers=None):
+        attempts = self.retry.attempts if self.retry is not None else 1
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.before_request()
+            try:
+                response = self._send(url, kind, headers)
+            except Exception as e:
+                # any error counts against the breaker, or a failed half-open trial would keep it half-open
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record_failure()
+                if last_attempt or not isinstance(e, (OSError, http.client.HTTPException)):
+                    raise
+                logger.debug("Request to %s failed (%s), retrying", url, e)
+            else:
+                if self.circuit_breaker is not None:
+                    if response.status >= 500 or response.status == 429:
+                        self.circuit_breaker.record_failure()
+                    else:
+                        self.circuit_breaker.record_success()
+                if self.retry is None or last_attempt or response.status not in self.retry.retry_statuses:
+                    return response
+                logger.debug("Request to %s returned %s, retrying", url, response.status)
+            self.retry.backoff(attempt)
+
+    def _send(self, url, kind, headers=None):
+        if self.stats is None:
+            return self.transport.request(url, headers)
+        start = time.perf_counter()
         try:
-            if self.token is None:
-                raise TokenInvalid()
+            response = self.transport.request(url, headers)
+        except Exception:
+            self.stats.record_request(kind, time.perf_counter() - start, 0, error=True)
+            raise
+        self.stats.record_request(kind, time.perf_counter() - start, response.wire_size, error=response.status >= 400)
+        return response
+
+    def decode(self, body, sections=None):
+        if self.stats is None:
+            return decode_payload(body, sections)
+        start = time.perf_counter()
+        data = decode_payload(body, sections)
+        self.stats.record_decode(time.perf_counter() - start)
+        return data
+
+    def get(self, url, kind='request'):
+        response = self.request(url, kind)
+        response.raise_for_status(url)
+        return response
+
+    def refresh_token(self):
+        response = self.get(urljoin(self.BASE_URL, LOGIN_URL % self.name), 'login')
+        if self.stats is not None:
+            self.stats.record_token_refresh()
+        data = self.decode(response.body)
+        self.token = data['token']  # actual token
+        self.state = data['credentials']  # readonly
+        self.token_issued = time.time()
+        if self.token_cache is not None:
+            self.token_cache.set(self.name, self.token, self.state, self.token_issued)
+
+    def token_expiring(self, issued=None):
+        issued = self.token_issued if issued is None else issued
+        if self.token_ttl is None or issued is None:
+            return False
+        return time.time() - issued > self.token_ttl - self.token_refresh_margin
+
+    def refresh_token_once(self, stale_token):
+        # single-flight: callers that saw the same stale token wait here and reuse the new one
+        with self._token_lock:
+            if self.token is not None and self.token != stale_token and not self.token_expiring():
+                return self.token
+            if self.token_cache is not None:
+                cached = self.token_cache.get(self.name)
+                if cached is not None and cached[0] != stale_token and not self.token_expiring(cached[2]):
+                    self.token, self.state, self.token_issued = cached
+                    return self.token
+            self.refresh_token()
+            return self.token
+
+    def ensure_token(self):
+        token = self.token
+        if token is None or self.token_expiring():
+            token = self.refresh_token_once(token)
+        return token
+
+    def make_request(self, url, *args, sections=None, **kwargs):
+        return self.fetch(url, sections=sections)[1]
+
+    def fetch(self, url, headers=None, known=None, sections=None, decode=True):
+        """Authenticated GET of `url`, returns (response, decoded data).
+
+        The data is None when the server answered 304 Not Modified or the body
+        has the fingerprint `known`, in which case it is not decoded at all.
+        With decode=False the raw body is returned instead of the decoded data
+        and only the status code can tell a rejected token.
+        """
+        token = self.ensure_token()
+        refreshed = False
+        while True:
             absolute_url = urljoin(
                 self.BASE_URL,
-                "%stoken=%s" % (url, self.token)
+                "%stoken=%s" % (url, token)
             )
             logger.debug(absolute_url)
-            with request.urlopen(absolute_url) as data:
-                return json.load(data)
-        except TokenInvalid:
-            self.refresh_token()
-            return self.make_request(url, *args, **kwargs)
+            response = self.request(absolute_url, headers=headers)
+            if response.status == 304 or (known is not None and fingerprint(response.body) == known):
+                return response, None
+            if response.status >= 400:
+                data = None
+            elif decode:
+                data = self.decode(response.body, sections)
+            else:
+                data = response.body
+            if not token_invalid(response.status, data):
+                response.raise_for_status(absolute_url)
+                return response, data
+            if refreshed:
+                raise TokenInvalid("Token for %s rejected after refresh" % self.name)
+            logger.debug("Token for %s rejected, refreshing", self.name)
+            token = self.refresh_token_once(token)
+            refreshed = True
+
+    def controller_data_url(self):
+        return CONTROLLER_DATA_URL if self.screen is None else CONTROLLER_DATA_PATH + self.screen.query()
+
+    def fetch_raw(self):
+        """Undecoded controllerdata2 body, for decoding in another process (see ingest)."""
+        return self.fetch(self.controller_data_url(), {'Accept-Encoding': 'gzip'}, decode=False)[1]
 
     def update_controller_data(self):
-        self.cached_data = self.make_request("v16bckbeta/dataout2/controllerdata2.php?screen=b1%2C17%2Cb2%2C5%2Cb3%2C4%2Cb4%2C6%2Cb5%2C12%2Cb6%2C14%2Cb7%2C15%2Cb8%2C16%2Cb9%2C9%2Cb10%2C7%2Cd1%2C3%2Cd2%2C4%2Cd3%2C4%2Cd4%2C0%2Cd5%2C0%2Cd6%2C0%2Cd7%2C0%2Cd8%2C0%2Cd9%2C0%2Cd10%2C0%2Ch1%2C2%2Ch2%2C3%2Ch3%2C5%2Ch4%2C13%2Ch5%2C4%2Ch6%2C1%2Ch7%2C9%2Ch8%2C10%2Ch9%2C7%2Ch10%2C8%2Cw1%2C2%2Cw2%2C3%2Cw3%2C9%2Cw4%2C4%2Cw5%2C5&")
+        url = self.controller_data_url()
+        headers = {'Accept-Encoding': 'gzip'}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        response, data = self.fetch(url, headers, self.fingerprint, self.sections)
+        if data is not None:
+            self.cached_data = data
+            self.raw_data = response.body
+            self.etag = response.headers.get('etag')
+            self.fingerprint = fingerprint(response.body)
         self.last_fetch = time.time()
+        self._record_history()
+
+    def _record_history(self):
+        if self.history is not None:
+            try:
+                self.history.append(self.snapshot(), self.last_fetch)
+            except NotConnectedException:
+                pass
+
+    def _load_shared(self):
+        entry = self.cache.get(self.name)
+        if entry is None or time.time() - entry[0] > self.cache_time_seconds:
+            return False
+        fetched, body = entry
+        if fetched == self.last_fetch:
+            return True
+        key = fingerprint(body)
+        if key != self.fingerprint:
+            self.cached_data = self.decode(body, self.sections)
+            self.raw_data = body
+            self.etag = None
+            self.fingerprint = key
+        self.last_fetch = fetched
+        self._record_history()
+        return True
+
+    def refresh_controller_data(self):
+        """Update the cached payload, from the shared cache when another process fetched it recently.
+
+        Records the time in last_refresh and the exception, or None, in last_refresh_error.
+        """
+        self.last_refresh = time.time()
+        try:
+            self._refresh_controller_data()
+        except Exception as e:
+            self.last_refresh_error = e
+            raise
+        self.last_refresh_error = None
+
+    def _refresh_controller_data(self):
+        if self.cache is None:
+            self.update_controller_data()
+            return
+        if self._load_shared():
+            return
+        with self.cache.lock(self.name):
+            # whoever held the lock before us may just have fetched it
+            if self._load_shared():
+                return
+            self.update_controller_data()
+            self.cache.set(self.name, self.raw_data, self.last_fetch)
+
+    def snapshot(self):
+        """ControllerData for the cached payload, the same object until the payload changes."""
+        data, snapshot = self.cached_data, self._snapshot
+        if snapshot is None or snapshot.data is not data:
+            snapshot = self._snapshot = ControllerData(data, screen=self.screen)
+        return snapshot
+
+    def cache_fresh(self):
+        return self.last_fetch is not None and (time.time() - self.last_fetch) <= self.cache_time_seconds
+
+    def _revalidate(self):
+        try:
+            self.refresh_controller_data()
+        except Exception as e:
+            logger.warning("Background refresh for %s failed: %s", self.name, e)
+        finally:
+            self._data_lock.release()
 
     def controller_data(self):
-        if not self.last_fetch or (time.time() - self.last_fetch) > self.cache_time_seconds:
+        hit, stale = True, False
+        if not self.cache_fresh():
+            if self.stale_while_revalidate and self.last_fetch is not None:
+                stale = True
+                # the lock is released by the background thread once it is done
+                if self._data_lock.acquire(blocking=False):
+                    threading.Thread(target=self._revalidate, daemon=True).start()
+            else:
+                with self._data_lock:
+                    # another thread may have refreshed while we were waiting
+                    if not self.cache_fresh():
+                        hit = False
+                        self.refresh_controller_data()
+        if self.stats is not None:
+            self.stats.record_cache(hit, stale)
+        return self.snapshot()
+
+    def fetch_controller_data(self):
+        # bypasses the cache, used by the subscription poll loop
+        with self._data_lock:
             self.update_controller_data()
-        return ControllerData(self.cached_data)
+            if self.cache is not None:
+                self.cache.set(self.name, self.raw_data, self.last_fetch)
+        if self.stats is not None:
+            self.stats.record_cache(False, False)
+        return self.snapshot()
+
+    @property
+    def subscriptions(self):
+        if self._subscriptions is None:
+            self._subscriptions = SubscriptionHub(self)
+        return self._subscriptions
+
+    def subscribe(self, callback, changes_only=False, deadbands=None):
+        """Call `callback` with every polled snapshot, or a dict of changes when changes_only is set.
+
+        All subscriptions share one poll loop whose interval follows the boiler
+        state, see subscription.AdaptiveInterval. Returns a Subscription with cancel().
+        """
+        return self.subscriptions.subscribe(callback, changes_only, deadbands)
+
+    def stream(self, changes_only=False, deadbands=None, max_pending=100):
+        """Async iterator variant of subscribe(), keeping at most `max_pending` unread items."""
+        return self.subscriptions.stream(changes_only, deadbands, max_pending)
 
+    def close(self):
+        if self._subscriptions is not None:
+            self._subscriptions.stop()
+        self.transport.close()
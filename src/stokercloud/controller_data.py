@@ -1,10 +1,15 @@
 import decimal
+import functools
+import operator
 from enum import Enum
 
 
 class NotConnectedException(Exception):
     pass
 
+class FieldNotRequested(Exception):
+    pass
+
 class PowerState(Enum):
     on  = 1
     off = 0
@@ -32,11 +37,30 @@ class State(Enum):
     CZUW_TempOsiag = 'lng_state_25'
 
 STATE_BY_VALUE = {key.value: key for key in State}
+STATE_NAME_BY_VALUE = {key.value: key.name for key in State}
+POWER_STATE_BY_VALUE = {0: PowerState.off, 1: PowerState.on}
 
+@functools.total_ordering
 class Value:
-    def __init__(self, value, unit):
-        self.value = decimal.Decimal(value)
-        self.unit = unit
+    __slots__ = ('value', 'unit')
+
+    def __init__(self, value, unit, exact=True):
+        # exact=False keeps a float, cheaper when Decimal precision isn't needed
+        object.__setattr__(self, 'value', decimal.Decimal(value) if exact else float(value))
+        object.__setattr__(self, 'unit', unit)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Value is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Value is immutable")
+
+    def __reduce__(self):
+        return self.__class__, (self.value, self.unit, self.exact)
+
+    @property
+    def exact(self):
+        return isinstance(self.value, decimal.Decimal)
 
     def __eq__(self, other):
         if not isinstance(other, Value):
@@ -44,36 +68,316 @@ class Value:
             return NotImplemented
         return self.value == other.value and self.unit == other.unit
 
+    def __hash__(self):
+        return hash((self.value, self.unit))
+
+    def _check_unit(self, other):
+        if self.unit != other.unit:
+            raise TypeError("Cannot combine %s with %s" % (self.unit, other.unit))
+
+    def __lt__(self, other):
+        if not isinstance(other, Value):
+            return NotImplemented
+        self._check_unit(other)
+        return self.value < other.value
+
+    def _combine(self, other, op):
+        if not isinstance(other, Value):
+            return NotImplemented
+        self._check_unit(other)
+        if self.exact and other.exact:
+            return Value(op(self.value, other.value), self.unit)
+        return Value(op(float(self.value), float(other.value)), self.unit, exact=False)
+
+    def _scale(self, factor, op):
+        if isinstance(factor, Value) or not isinstance(factor, (int, float, decimal.Decimal)):
+            return NotImplemented
+        if self.exact and not isinstance(factor, float):
+            return Value(op(self.value, factor), self.unit)
+        return Value(op(float(self.value), float(factor)), self.unit, exact=False)
+
+    def __add__(self, other):
+        return self._combine(other, operator.add)
+
+    def __sub__(self, other):
+        return self._combine(other, operator.sub)
+
+    def __mul__(self, factor):
+        return self._scale(factor, operator.mul)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, factor):
+        return self._scale(factor, operator.truediv)
+
+    def __neg__(self):
+        return Value(-self.value, self.unit, exact=self.exact)
+
+    def __abs__(self):
+        return Value(abs(self.value), self.unit, exact=self.exact)
+
+    def __float__(self):
+        return float(self.value)
+
     def __repr__(self):
         return "%s %s" % (self.value, self.unit)
 
+class Field:
+    __slots__ = ('name', 'section', 'key', 'unit', 'precision')
+
+    def __init__(self, name, section, key, unit, precision=None):
+        self.name = name
+        self.section = section
+        self.key = key
+        self.unit = unit
+        self.precision = precision
+
+    def __repr__(self):
+        return "Field(%s: %s/%s)" % (self.name, self.section, self.key)
+
+# sections holding a list of {"id": ..., "value": ...} items
+LIST_SECTIONS = frozenset(['frontdata', 'boilerdata', 'hopperdata', 'dhwdata'])
+
+FIELDS = (
+    Field('boiler_temperature_current', 'frontdata', 'boilertemp', Unit.DEGREE),
+    Field('boiler_temperature_requested', 'frontdata', '-wantedboilertemp', Unit.DEGREE),
+    Field('hotwater_temperature_current', 'frontdata', 'dhw', Unit.DEGREE, 1),
+    Field('hotwater_temperature_requested', 'frontdata', 'dhwwanted', Unit.DEGREE),
+    Field('oxygen_reference', 'frontdata', 'refoxygen', Unit.PERCENT),
+    Field('smoke_temperature', 'frontdata', 'smoketemp', Unit.DEGREE, 1),
+    Field('airflow', 'frontdata', 'refair', Unit.M3H),
+    Field('hopper_distance', 'frontdata', 'hopperdistance', Unit.PERCENT),
+    Field('pressure', 'frontdata', 'pressure', Unit.PASCAL),
+    Field('exhaust', 'frontdata', 'exhaust', Unit.PERCENT),
+    Field('ashdist', 'frontdata', 'ashdist', Unit.PERCENT),
+    Field('boiler_kwh', 'boilerdata', '5', Unit.KWH),
+    Field('boiler_percent', 'boilerdata', '4', Unit.PERCENT),
+    Field('oxygen_current', 'boilerdata', '12', Unit.PERCENT),
+    Field('oxygen_low', 'boilerdata', '14', Unit.PERCENT),
+    Field('oxygen_mid', 'boilerdata', '15', Unit.PERCENT),
+    Field('oxygen_high', 'boilerdata', '16', Unit.PERCENT),
+    Field('boiler_temp_return', 'boilerdata', '17', Unit.DEGREE),
+    Field('boiler_temp_dropshaft', 'boilerdata', '7', Unit.DEGREE, 1),
+    Field('consumption_total', 'hopperdata', '4', Unit.KILO_GRAM),
+    Field('consumption_day', 'hopperdata', '3', Unit.KILO_GRAM),
+    Field('auger_capacity', 'hopperdata', '2', Unit.GRAM),
+    Field('hopper_content', 'hopperdata', '1', Unit.KILO_GRAM),
+    Field('hopper_trip1', 'hopperdata', '5', Unit.KILO_GRAM),
+    Field('hopper_trip2', 'hopperdata', '13', Unit.KILO_GRAM),
+    Field('power_10_percent', 'hopperdata', '7', Unit.KWH),
+    Field('power_100_percent', 'hopperdata', '8', Unit.KWH),
+    Field('compressor_cleaning', 'leftoutput', 'output-7', Unit.KILO_GRAM),
+    Field('dhw_difference_under', 'dhwdata', '3', Unit.DEGREE),
+    Field('zone1_flow_wanted', 'weathercomp', 'zone1-wanted', Unit.DEGREE, 1),
+    Field('zone1_flow_current', 'weathercomp', 'zone1-actual', Unit.DEGREE, 1),
+    Field('zone1_current_temperature', 'weathercomp', 'zone1-actualref', Unit.DEGREE, 1),
+    Field('zone1_avarage_temperature', 'weathercomp', 'zone1-calc', Unit.DEGREE, 1),
+    Field('zone2_flow_wanted', 'weathercomp', 'zone2-wanted', Unit.DEGREE, 1),
+    Field('zone2_flow_current', 'weathercomp', 'zone2-actual', Unit.DEGREE, 1),
+    Field('zone2_current_temperature', 'weathercomp', 'zone2-actualref', Unit.DEGREE, 1),
+    Field('zone2_avarage_temperature', 'weathercomp', 'zone2-calc', Unit.DEGREE, 1),
+)
+
+FIELD_BY_NAME = {field.name: field for field in FIELDS}
+
+# on/off and state properties compared by diff() and ChangeTracker next to FIELDS
+DISCRETE_FIELDS = ('state', 'alarm', 'running', 'dhw_pump', 'boiler_pump', 'weather_pump', 'weather_pump2')
+
+# top level keys of the controllerdata2 payload read by ControllerData
+SECTIONS = frozenset(
+    [field.section for field in FIELDS] + ['miscdata', 'leftoutput', 'weathercomp', 'serial', 'notconnected']
+)
+
+class Screen:
+    """The `screen` parameter of controllerdata2.php.
+
+    The dashboard has ten boiler, ten DHW, ten hopper and five weather boxes,
+    each showing one item id; only the selected ids are sent back in the
+    matching section. frontdata, miscdata and the outputs are always sent.
+    """
+    BOXES = (('boilerdata', 'b', 10), ('dhwdata', 'd', 10), ('hopperdata', 'h', 10), ('weatherdata', 'w', 5))
+
+    def __init__(self, boiler=(), dhw=(), hopper=(), weather=()):
+        self.ids = {}
+        for (section, prefix, count), ids in zip(self.BOXES, (boiler, dhw, hopper, weather)):
+            ids = tuple(str(_id) for _id in ids)
+            if len(ids) > count:
+                raise ValueError("%s takes at most %d ids" % (section, count))
+            self.ids[section] = ids
+        self.fields = tuple(field for field in FIELDS if self.requested(field))
+
+    @classmethod
+    def for_fields(cls, names):
+        ids = {section: [] for section, _, _ in cls.BOXES}
+        for name in names:
+            field = FIELD_BY_NAME[name]
+            if field.section in ids and field.key not in ids[field.section]:
+                ids[field.section].append(field.key)
+        return cls(ids['boilerdata'], ids['dhwdata'], ids['hopperdata'], ids['weatherdata'])
+
+    def requested(self, field):
+        ids = self.ids.get(field.section)
+        return ids is None or field.key in ids
+
+    def query(self):
+        parts = []
+        for section, prefix, count in self.BOXES:
+            ids = self.ids[section]
+            for box in range(count):
+                parts += ['%s%d' % (prefix, box + 1), ids[box] if box < len(ids) else '0']
+        return 'screen=%s&' % '%2C'.join(parts)
+
+DEFAULT_SCREEN = Screen(
+    boiler=(17, 5, 4, 6, 12, 14, 15, 16, 9, 7),
+    dhw=(3, 4, 4),
+    hopper=(2, 3, 5, 13, 4, 1, 9, 10, 7, 8),
+    weather=(2, 3, 9, 4, 5),
+)
+
+def to_number(raw, precision=None):
+    try:
+        number = float(raw)
+    except (TypeError, ValueError):
+        # "N/A", "disabled" and missing items
+        return None
+    if precision is not None:
+        number = round(number, precision)
+    return number
+
+def changed(old, new, deadband=0):
+    if old is None or new is None:
+        return old is not new
+    if isinstance(old, str) or isinstance(new, str):
+        return old != new
+    return abs(new - old) > deadband
+
+def diff_records(previous, current, deadbands=None):
+    deadbands = deadbands or {}
+    return {
+        name: value for name, value in current.items()
+        if changed(previous.get(name), value, deadbands.get(name, 0))
+    }
+
 def get_from_list_by_key(lst, key, value):
     for itm in lst:
         if itm.get(key) == value:
             return itm
 
+def index_list_by_key(lst, key):
+    index = {}
+    for itm in lst:
+        # keep the first match, same as get_from_list_by_key
+        index.setdefault(itm.get(key), itm)
+    return index
+
+class ChangeTracker:
+    """Stream of changed fields across consecutive snapshots.
+
+    Deadbands are measured against the last value reported for a field, so
+    a slow drift is still reported once it adds up to more than the deadband.
+    """
+
+    def __init__(self, deadbands=None):
+        self.deadbands = deadbands or {}
+        self.last = {}
+
+    def update(self, controller_data):
+        current = controller_data.change_record()
+        changes = diff_records(self.last, current, self.deadbands) if self.last else current
+        self.last.update(changes)
+        return changes
+
+
 class ControllerData:
-    def __init__(self, data):
+    def __init__(self, data, exact=True, screen=None):
         if data['notconnected'] != 0:
             raise NotConnectedException("Boiler not connected to StokerCloud")
         self.data = data
+        # exact=False builds float-backed Values
+        self.exact = exact
+        # the Screen the data was requested with, None when unknown
+        self.screen = screen
+        self.fields = screen.fields if screen is not None else FIELDS
+        self._index = {}
+        # parsed values are memoized, a snapshot never changes
+        self._values = {}
+        self._record = None
+
+    def get_index(self, submenu):
+        index = self._index.get(submenu)
+        if index is None:
+            index = self._index[submenu] = index_list_by_key(self.data[submenu], 'id')
+        return index
 
     def get_sub_item(self, submenu, _id):
-        return get_from_list_by_key(self.data[submenu], 'id', _id)
+        return self.get_index(submenu).get(_id)
+
+    def get_raw(self, field):
+        if field.section in LIST_SECTIONS:
+            item = self.get_sub_item(field.section, field.key)
+            return item['value'] if item is not None else None
+        item = self.data.get(field.section, {}).get(field.key)
+        return item['val'] if item is not None else None
+
+    def requested(self, name):
+        return self.screen is None or self.screen.requested(FIELD_BY_NAME[name])
+
+    def field_value(self, name):
+        value = self._values.get(name)
+        if value is not None:
+            return value
+        field = FIELD_BY_NAME[name]
+        if self.screen is not None and not self.screen.requested(field):
+            raise FieldNotRequested("%s was not part of the requested screen" % name)
+        raw = self.get_raw(field)
+        if field.precision is None:
+            value = Value(raw, field.unit, exact=self.exact)
+        elif self.exact:
+            value = Value(format(float(raw), '.%df' % field.precision), field.unit)
+        else:
+            value = Value(round(float(raw), field.precision), field.unit, exact=False)
+        self._values[name] = value
+        return value
+
+    def to_dict(self):
+        if self._record is None:
+            self._record = {field.name: to_number(self.get_raw(field), field.precision) for field in self.fields}
+        return dict(self._record)
+
+    def change_record(self):
+        """to_dict() plus the DISCRETE_FIELDS, as plain strings and ints."""
+        record = self.to_dict()
+        misc = self.data['miscdata']
+        # an unknown state is reported by its raw value rather than as None
+        record['state'] = self.state or self.state_pom
+        record['alarm'] = misc.get('alarm')
+        record['running'] = misc.get('running')
+        for name in DISCRETE_FIELDS[3:]:
+            record[name] = getattr(self, name)
+        return record
+
+    def diff(self, previous, deadbands=None):
+        """Fields whose value differs from `previous` by more than their deadband.
+
+        Numeric fields and the DISCRETE_FIELDS are compared; a discrete field is
+        reported on any change.
+        """
+        current = self.change_record()
+        if previous is None:
+            return current
+        return diff_records(previous.change_record(), current, deadbands)
+
+    def as_record(self):
+        record = self.to_dict()
+        return {field.name: (record[field.name], field.unit) for field in self.fields}
 
     @property
     def alarm(self):
-        return {
-            0: PowerState.off,
-            1: PowerState.on
-        }.get(self.data['miscdata'].get('alarm'))
+        return POWER_STATE_BY_VALUE.get(self.data['miscdata'].get('alarm'))
 
     @property
     def running(self):
-        return {
-            0: PowerState.off,
-            1: PowerState.on
-        }.get(self.data['miscdata'].get('running'))
+        return POWER_STATE_BY_VALUE.get(self.data['miscdata'].get('running'))
 
     @property
     def serial_number(self):
@@ -81,83 +385,83 @@ class ControllerData:
 
     @property
     def boiler_temperature_current(self):
-        return Value(self.get_sub_item('frontdata', 'boilertemp')['value'], Unit.DEGREE)
+        return self.field_value('boiler_temperature_current')
 
     @property
     def boiler_temperature_requested(self):
-        return Value(self.get_sub_item('frontdata', '-wantedboilertemp')['value'], Unit.DEGREE)
+        return self.field_value('boiler_temperature_requested')
 
     @property                                                                                                      
     def hotwater_temperature_current(self):                                                                        
-        return Value(format(self.get_sub_item('frontdata', 'dhw')['value'], '.1f'), Unit.DEGREE)                                  
+        return self.field_value('hotwater_temperature_current')
                                                                                                                    
     @property                                                                                                      
     def hotwater_temperature_requested(self):                                                                      
-        return Value(self.get_sub_item('frontdata', 'dhwwanted')['value'], Unit.DEGREE)                            
+        return self.field_value('hotwater_temperature_requested')
 
     @property                                                                                                      
     def oxygen_reference(self):                                                                                    
-        return Value(self.get_sub_item('frontdata', 'refoxygen')['value'], Unit.PERCENT)                           
+        return self.field_value('oxygen_reference')
                                                                                                                    
     @property                                                                                                      
     def smoke_temperature(self):                                                                                    
-        return Value(format(self.get_sub_item('frontdata', 'smoketemp')['value'], '.1f'), Unit.DEGREE)                           
+        return self.field_value('smoke_temperature')
                                                                                                                    
     @property                                                                                                      
     def airflow(self):                                                                                             
-        return Value(self.get_sub_item('frontdata', 'refair')['value'], Unit.M3H) #Airflow m3/h                    
+        return self.field_value('airflow') #Airflow m3/h
 
     @property                                                                                                      
     def hopper_distance(self):                                                                                    
-        return Value(self.get_sub_item('frontdata', 'hopperdistance')['value'], Unit.PERCENT)                           
+        return self.field_value('hopper_distance')
                                                                                                                    
     @property                                                                                                      
     def pressure(self):                                                                                    
-        return Value(self.get_sub_item('frontdata', 'pressure')['value'], Unit.PASCAL)                           
+        return self.field_value('pressure')
 
     @property                                                                                                      
     def exhaust(self):                                                                                            
-        return Value(self.get_sub_item('frontdata', 'exhaust')['value'], Unit.PERCENT)                             
+        return self.field_value('exhaust')
 
     @property                                                                                                      
     def ashdist(self):                                                                                            
-        return Value(self.get_sub_item('frontdata', 'ashdist')['value'], Unit.PERCENT)                             
+        return self.field_value('ashdist')
                                                                                                                    
     @property
     def boiler_kwh(self):
-        return Value(self.get_sub_item('boilerdata', '5')['value'], Unit.KWH)
+        return self.field_value('boiler_kwh')
 
     @property                                                                                                      
     def boiler_percent(self):                                                                                          
-        return Value(self.get_sub_item('boilerdata', '4')['value'], Unit.PERCENT)                                      
+        return self.field_value('boiler_percent')
 
     @property                                                                                                      
     def oxygen_current(self):                                                                                      
-        return Value(self.get_sub_item('boilerdata', '12')['value'], Unit.PERCENT) #O2                             
+        return self.field_value('oxygen_current') #O2
                                                                                                                    
     @property                                                                                                      
     def oxygen_low(self):                                                                                          
-        return Value(self.get_sub_item('boilerdata', '14')['value'], Unit.PERCENT) #O2 low                         
+        return self.field_value('oxygen_low') #O2 low
                                                                                                                    
     @property                                                                                                      
     def oxygen_mid(self):                                                                                          
-        return Value(self.get_sub_item('boilerdata', '15')['value'], Unit.PERCENT) #O2 mid                         
+        return self.field_value('oxygen_mid') #O2 mid
                                                                                                                    
     @property                                                                                                      
     def oxygen_high(self):                                                                                         
-        return Value(self.get_sub_item('boilerdata', '16')['value'], Unit.PERCENT) #O2 high                        
+        return self.field_value('oxygen_high') #O2 high
                                                                                                                    
     @property                                                                                                      
     def boiler_temp_return(self):                                                                                          
-        return Value(self.get_sub_item('boilerdata', '17')['value'], Unit.DEGREE)                                      
+        return self.field_value('boiler_temp_return')
 
     @property                                                                                                      
     def boiler_temp_dropshaft(self):                                                                                          
-        return Value(format(self.get_sub_item('boilerdata', '7')['value'], '.1f'), Unit.DEGREE)                                      
+        return self.field_value('boiler_temp_dropshaft')
 
     @property                                                                            
     def state(self):                                                                           
-        return STATE_BY_VALUE.get(self.data['miscdata']['state']['value']).name      
+        return STATE_NAME_BY_VALUE.get(self.data['miscdata']['state']['value'])
 
     @property                                                                            
     def clock(self):                                                                           
@@ -169,35 +473,35 @@ class ControllerData:
 
     @property
     def consumption_total(self):
-        return Value(self.get_sub_item('hopperdata', '4')['value'], Unit.KILO_GRAM)
+        return self.field_value('consumption_total')
     
     @property
     def consumption_day(self):
-        return Value(self.get_sub_item('hopperdata', '3')['value'], Unit.KILO_GRAM)
+        return self.field_value('consumption_day')
 
     @property                                                                                  
     def auger_capacity(self):                                                                        
-        return Value(self.get_sub_item('hopperdata', '2')['value'], Unit.GRAM) #Auger capacity                                         
+        return self.field_value('auger_capacity') #Auger capacity
 
     @property                                                                                                      
     def hopper_content(self):                                                                                      
-        return Value(self.get_sub_item('hopperdata', '1')['value'], Unit.KILO_GRAM)                    
+        return self.field_value('hopper_content')
                                                                                                                    
     @property                                                                                                      
     def hopper_trip1(self):                                                                                        
-        return Value(self.get_sub_item('hopperdata', '5')['value'], Unit.KILO_GRAM)                                            
+        return self.field_value('hopper_trip1')
                                                                                                                    
     @property                                                                                                      
     def hopper_trip2(self):                                                                                        
-        return Value(self.get_sub_item('hopperdata', '13')['value'], Unit.KILO_GRAM)                                             
+        return self.field_value('hopper_trip2')
                                                                                                                    
     @property                                                                                  
     def power_10_percent(self):                                                                        
-        return Value(self.get_sub_item('hopperdata', '7')['value'], Unit.KWH) #Power 10%                                          
+        return self.field_value('power_10_percent') #Power 10%
                                                                                                
     @property                                                                                  
     def power_100_percent(self):                                                                        
-        return Value(self.get_sub_item('hopperdata', '8')['value'], Unit.KWH) #Power 100%                                          
+        return self.field_value('power_100_percent') #Power 100%
                                                                                                
     @property                                                                                   
     def dhw_pump(self):                                                                              
@@ -225,7 +529,7 @@ class ControllerData:
                                                                                                 
     @property                                                                                   
     def compressor_cleaning(self):                                                                              
-        return Value(self.data['leftoutput']['output-7']['val'], Unit.KILO_GRAM) #Compressor cleaning       
+        return self.field_value('compressor_cleaning') #Compressor cleaning
                                                                                                 
     @property                                                                                   
     def l_8(self):                                                                              
@@ -237,7 +541,7 @@ class ControllerData:
                                                                                                 
     @property                                                                                  
     def dhw_difference_under(self):                                                                        
-        return Value(self.get_sub_item('dhwdata', '3')['value'], Unit.DEGREE) #DHW-Difference under                                          
+        return self.field_value('dhw_difference_under') #DHW-Difference under
 
     @property                                                                                  
     def hopper_distance_max(self):                                                                          
@@ -253,11 +557,11 @@ class ControllerData:
                                                                                                
     @property                                                                                  
     def zone1_flow_wanted(self):                                                                             
-        return Value(format(float(self.data['weathercomp']['zone1-wanted']['val']), '.1f'), Unit.DEGREE)                                
+        return self.field_value('zone1_flow_wanted')
                                                                                                
     @property                                                                                  
     def zone1_flow_current(self):                                                                             
-        return Value(format(float(self.data['weathercomp']['zone1-actual']['val']), '.1f'), Unit.DEGREE)                                
+        return self.field_value('zone1_flow_current')
                                                                                                
     @property                                                                                  
     def zone1_valve_position(self):                                                                             
@@ -265,19 +569,19 @@ class ControllerData:
                                                                                                
     @property                                                                                  
     def zone1_current_temperature(self):                                                                             
-        return Value(format(float(self.data['weathercomp']['zone1-actualref']['val']), '.1f'), Unit.DEGREE)                               
+        return self.field_value('zone1_current_temperature')
                                                                                                
     @property                                                                                  
     def zone1_avarage_temperature(self):                                                                             
-        return Value(format(float(self.data['weathercomp']['zone1-calc']['val']), '.1f'), Unit.DEGREE)                               
+        return self.field_value('zone1_avarage_temperature')
                                                                                                
     @property                                                                                  
     def zone2_flow_wanted(self):                                                                            
-        return Value(format(float(self.data['weathercomp']['zone2-wanted']['val']), '.1f'), Unit.DEGREE)
+        return self.field_value('zone2_flow_wanted')
                                                                                                
     @property                                                                                  
     def zone2_flow_current(self):                                                                            
-        return Value(format(float(self.data['weathercomp']['zone2-actual']['val']), '.1f'), Unit.DEGREE)                               
+        return self.field_value('zone2_flow_current')
                                                                                                
     @property                                                                                  
     def zone2_valve_position(self):                                                                            
@@ -285,8 +589,8 @@ class ControllerData:
                                                                                                
     @property                                                                                  
     def zone2_current_temperature(self):                                                                            
-        return Value(format(float(self.data['weathercomp']['zone2-actualref']['val']), '.1f'), Unit.DEGREE)                            
+        return self.field_value('zone2_current_temperature')
                                                                                          
     @property                                                                                  
     def zone2_avarage_temperature(self):                                                                            
-        return Value(format(float(self.data['weathercomp']['zone2-calc']['val']), '.1f'), Unit.DEGREE) 
+        return self.field_value('zone2_avarage_temperature')
@@ -0,0 +1,32 @@
+import hashlib
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# needed to tell a disconnected boiler or a rejected token, whatever the sections
+ALWAYS_KEPT = ('notconnected', 'error', 'status')
+
+
+def loads(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def decode_payload(raw, sections=None):
+    """Decode a controllerdata2 response, keeping only `sections` when given.
+
+    Pass stokercloud.controller_data.SECTIONS to keep what ControllerData reads.
+    """
+    data = loads(raw)
+    if sections is None or not isinstance(data, dict):
+        return data
+    return {key: value for key, value in data.items() if key in sections or key in ALWAYS_KEPT}
+
+
+def fingerprint(raw):
+    """Digest of a raw response body, equal for byte-identical payloads."""
+    return hashlib.sha1(raw).digest()
@@ -0,0 +1,124 @@
+import math
+import time
+
+# energy content of wood pellets, kWh per kg
+PELLET_KWH_PER_KG = 4.8
+
+
+class EWMA:
+    """Exponentially weighted moving average over irregularly spaced samples.
+
+    A sample `half_life` seconds old has half the weight of the newest one.
+    """
+    __slots__ = ('half_life', 'value')
+
+    def __init__(self, half_life: float):
+        self.half_life = half_life
+        self.value = None
+
+    def update(self, sample, dt):
+        if self.value is None:
+            self.value = sample
+        else:
+            alpha = 1 - math.exp(-dt * math.log(2) / self.half_life)
+            self.value += alpha * (sample - self.value)
+        return self.value
+
+
+def heat_output(boiler_percent, power_10_percent, power_100_percent):
+    """Output in kW, interpolated between the configured 10% and 100% power."""
+    if boiler_percent is None or power_10_percent is None or power_100_percent is None:
+        return None
+    if boiler_percent <= 0:
+        return 0.0
+    fraction = (boiler_percent - 10) / 90.0
+    return power_10_percent + fraction * (power_100_percent - power_10_percent)
+
+
+class DerivedMetrics:
+    """Burn rate, hopper autonomy, heat output, O2 deviation and efficiency.
+
+    Every snapshot passed to update() costs O(1) time and memory: the smoothed
+    values are EWMAs with a `half_life` in seconds, nothing is kept per sample.
+    Can be used directly as a Client.subscribe() callback.
+    """
+
+    def __init__(self, half_life: float = 900, calorific_value: float = PELLET_KWH_PER_KG):
+        self.calorific_value = calorific_value
+        self._burn_rate = EWMA(half_life)
+        self._heat_output = EWMA(half_life)
+        self._oxygen_deviation = EWMA(half_life)
+        self._last_timestamp = None
+        self._last_consumption = None
+        self.hopper_content = None
+        self.heat_output = None
+        self.oxygen_deviation = None
+
+    def update(self, controller_data, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        record = controller_data.to_dict()
+        dt = timestamp - self._last_timestamp if self._last_timestamp is not None else 0
+        if self._last_timestamp is not None and dt <= 0:
+            return self.values()
+
+        consumption = record.get('consumption_day')
+        if consumption is not None:
+            if self._last_consumption is not None and dt > 0:
+                # the daily counter restarts at midnight, everything on it was burnt since
+                burnt = consumption - self._last_consumption if consumption >= self._last_consumption else consumption
+                self._burn_rate.update(burnt * 3600.0 / dt, dt)
+            self._last_consumption = consumption
+
+        self.hopper_content = record.get('hopper_content')
+        self.heat_output = heat_output(
+            record.get('boiler_percent'), record.get('power_10_percent'), record.get('power_100_percent')
+        )
+        if self.heat_output is not None:
+            self._heat_output.update(self.heat_output, dt)
+
+        oxygen, reference = record.get('oxygen_current'), record.get('oxygen_reference')
+        self.oxygen_deviation = oxygen - reference if oxygen is not None and reference is not None else None
+        if self.oxygen_deviation is not None:
+            self._oxygen_deviation.update(self.oxygen_deviation, dt)
+
+        self._last_timestamp = timestamp
+        return self.values()
+
+    __call__ = update
+
+    @property
+    def burn_rate(self):
+        """Pellets burnt in kg per hour."""
+        return self._burn_rate.value
+
+    @property
+    def hours_to_empty(self):
+        if self.hopper_content is None or not self.burn_rate:
+            return None
+        return self.hopper_content / self.burn_rate
+
+    @property
+    def mean_heat_output(self):
+        return self._heat_output.value
+
+    @property
+    def mean_oxygen_deviation(self):
+        return self._oxygen_deviation.value
+
+    @property
+    def efficiency(self):
+        """Heat output over the energy content of the pellets burnt."""
+        if not self.burn_rate or self.mean_heat_output is None:
+            return None
+        return self.mean_heat_output / (self.burn_rate * self.calorific_value)
+
+    def values(self):
+        return {
+            'burn_rate': self.burn_rate,
+            'hours_to_empty': self.hours_to_empty,
+            'heat_output': self.heat_output,
+            'mean_heat_output': self.mean_heat_output,
+            'oxygen_deviation': self.oxygen_deviation,
+            'mean_oxygen_deviation': self.mean_oxygen_deviation,
+            'efficiency': self.efficiency,
+        }
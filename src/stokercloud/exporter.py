@@ -0,0 +1,200 @@
+import argparse
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from stokercloud.client import Client
+from stokercloud.controller_data import FIELDS, PowerState, STATE_BY_VALUE
+from stokercloud.fleet import FleetPoller
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'stokercloud_'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# (name, help) of every metric family, in exposition order
+FAMILIES = [
+    ('up', 'Whether the last poll of the account succeeded and its snapshot is recent.'),
+    ('snapshot_age_seconds', 'Seconds since the exported snapshot was fetched.'),
+    ('running', 'Whether the boiler is running.'),
+    ('alarm', 'Whether the boiler is in alarm.'),
+    ('state', 'Current boiler state, the active state is 1.'),
+] + [(field.name, '%s (%s).' % (field.name.replace('_', ' ').capitalize(), field.unit.value)) for field in FIELDS]
+
+FAMILY_INDEX = {name: index for index, (name, _) in enumerate(FAMILIES)}
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_snapshot(account, controller_data):
+    """Sample lines of one snapshot, grouped per metric family.
+
+    up and snapshot_age_seconds are left out, they change between polls.
+    """
+    lines = [[] for _ in FAMILIES]
+    labels = 'account="%s"' % escape_label(account)
+
+    def add(name, value, extra=''):
+        lines[FAMILY_INDEX[name]].append('%s%s{%s%s} %s\n' % (PREFIX, name, labels, extra, value))
+
+    if controller_data.running is not None:
+        add('running', int(controller_data.running == PowerState.on))
+    if controller_data.alarm is not None:
+        add('alarm', int(controller_data.alarm == PowerState.on))
+    state = STATE_BY_VALUE.get(controller_data.state_pom)
+    add('state', 1, ',state="%s"' % escape_label(state.name if state is not None else controller_data.state_pom))
+    for name, (value, unit) in controller_data.as_record().items():
+        if value is not None:
+            add(name, repr(value), ',unit="%s"' % unit.value)
+    return lines
+
+
+def render_down(account):
+    lines = [[] for _ in FAMILIES]
+    lines[FAMILY_INDEX['up']].append('%sup{account="%s"} 0\n' % (PREFIX, escape_label(account)))
+    return lines
+
+
+class Exporter:
+    """Prometheus text exposition for many accounts.
+
+    Accounts are polled in the background by a FleetPoller every `interval`
+    seconds; a scrape only reads the latest snapshots, so its latency does not
+    depend on StokerCloud or on accounts that never answer. Each snapshot is
+    rendered once and scrapes between two polls reuse it, refreshing only the
+    up and snapshot_age_seconds samples. An account is reported down until
+    its first snapshot, when its last poll failed, or when its snapshot is
+    older than `max_age` seconds.
+    """
+
+    def __init__(self, clients, max_age: float = 300, clock=time.time, interval: float = 10,
+                 max_workers: int = 8):
+        self.clients = list(clients)
+        self.max_age = max_age
+        self.clock = clock
+        self.poller = FleetPoller(self.clients, interval=interval, max_workers=max_workers,
+                                  callback=self._store, error_callback=self._store_error)
+        self._latest = {}
+        self._errors = {}
+        self._snapshots = {}
+        self._text = None
+        self._text_key = None
+        self._lock = threading.Lock()
+
+    def _store(self, name, controller_data):
+        self._latest[name] = controller_data
+        self._errors.pop(name, None)
+
+    def _store_error(self, name, error):
+        self._errors[name] = error
+
+    def start(self):
+        self.poller.start()
+        # the poller spreads its first round over one interval, fetch everything now instead
+        self.refresh(wait=False)
+
+    def stop(self):
+        self.poller.stop()
+
+    def refresh(self, wait: bool = True):
+        """Poll every account now, waiting for the results when `wait` is set."""
+        futures = [self.poller.submit(client.name) for client in self.clients]
+        if wait:
+            for future in futures:
+                if future is not None:
+                    future.result()
+
+    def _snapshot_lines(self, client):
+        controller_data = self._latest.get(client.name)
+        if controller_data is None:
+            return None, render_down(client.name)
+        cached = self._snapshots.get(client.name)
+        if cached is None or cached[0] is not controller_data:
+            cached = self._snapshots[client.name] = (controller_data, render_snapshot(client.name, controller_data))
+        age = int(max(self.clock() - client.last_fetch, 0))
+        up = int(client.name not in self._errors and client.last_refresh_error is None and age <= self.max_age)
+        labels = 'account="%s"' % escape_label(client.name)
+        lines = list(cached[1])
+        lines[FAMILY_INDEX['up']] = ['%sup{%s} %d\n' % (PREFIX, labels, up)]
+        lines[FAMILY_INDEX['snapshot_age_seconds']] = ['%ssnapshot_age_seconds{%s} %d\n' % (PREFIX, labels, age)]
+        return (id(controller_data), up, age), lines
+
+    def render(self):
+        snapshots = [self._snapshot_lines(client) for client in self.clients]
+        key = tuple(key for key, _ in snapshots)
+        with self._lock:
+            if self._text is not None and self._text_key == key and None not in key:
+                return self._text
+            parts = []
+            for index, (name, help_text) in enumerate(FAMILIES):
+                samples = [line for _, lines in snapshots for line in lines[index]]
+                if samples:
+                    parts.append('# HELP %s%s %s\n# TYPE %s%s gauge\n' % (PREFIX, name, help_text, PREFIX, name))
+                    parts.extend(samples)
+            self._text = ''.join(parts).encode('utf-8')
+            self._text_key = key
+            return self._text
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.exporter.render()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, exporter):
+        super().__init__(address, MetricsHandler)
+        self.exporter = exporter
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='stokercloud', description='Prometheus exporter for StokerCloud boilers')
+    parser.add_argument('accounts', nargs='+', help='StokerCloud user names')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=9845)
+    parser.add_argument('--cache-time', type=int, default=10, help='seconds between polls of one account')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--max-age', type=float, default=300, help='seconds after which a snapshot counts as down')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    # the exporter paces the polls, the clients do not cache on top of that
+    clients = [Client(name, cache_time_seconds=0, timeout=args.timeout) for name in args.accounts]
+    exporter = Exporter(clients, max_age=args.max_age, interval=args.cache_time)
+    server = MetricsServer((args.host, args.port), exporter)
+    logger.info("Serving metrics for %d account(s) on %s:%d", len(clients), args.host, args.port)
+    exporter.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        exporter.stop()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
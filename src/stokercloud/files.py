@@ -0,0 +1,36 @@
+"""Atomic replacement and advisory locking of the files behind the on-disk caches."""
+import contextlib
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def atomic_write(path, data):
+    """Replace `path` with the bytes `data`; readers never see a partial write."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.stokercloud-')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Exclusive flock on `path` across processes, a no-op where fcntl is not available."""
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
@@ -0,0 +1,152 @@
+import heapq
+import logging
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from stokercloud.client import Client
+
+logger = logging.getLogger(__name__)
+
+
+class FleetPoller:
+    """Poll many installations through a bounded thread pool.
+
+    Every account is polled once per `interval` seconds, spread over the
+    interval and jittered by +/- `jitter` (a fraction of the interval) so the
+    fleet does not hit StokerCloud in bursts. An account is never polled twice
+    at the same time. Snapshots are passed to `callback(name, controller_data)`
+    or, without a callback, can be consumed from `snapshots()`. At most
+    `max_pending` unread snapshots are kept; past that the oldest is dropped.
+    """
+
+    def __init__(self, accounts, interval: float = 10, jitter: float = 0.1, max_workers: int = 8,
+                 callback=None, error_callback=None, client_factory=Client, max_pending: int = 1000):
+        self.clients = {}
+        for account in accounts:
+            client = account if isinstance(account, Client) else client_factory(account)
+            self.clients[client.name] = client
+        self.interval = interval
+        self.jitter = jitter
+        self.max_workers = max_workers
+        self.callback = callback
+        self.error_callback = error_callback
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._schedule = []
+        self._in_flight = set()
+        self._condition = threading.Condition()
+        self._executor = None
+        self._thread = None
+        self._running = False
+
+    def _next_delay(self):
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _schedule_at(self, due, name):
+        with self._condition:
+            heapq.heappush(self._schedule, (due, name))
+            self._condition.notify()
+
+    def submit(self, name):
+        """Poll `name` now, returns the future or None when a poll is already in flight."""
+        if self._executor is None:
+            raise RuntimeError("FleetPoller is not started, call start() first")
+        return self._submit(name, reschedule=False)
+
+    def _submit(self, name, reschedule):
+        with self._condition:
+            if name in self._in_flight:
+                if reschedule:
+                    self._schedule_at(time.monotonic() + self._next_delay(), name)
+                return None
+            self._in_flight.add(name)
+        return self._executor.submit(self._poll, name, reschedule)
+
+    def _poll(self, name, reschedule):
+        try:
+            data = self.clients[name].controller_data()
+        except Exception as e:
+            logger.warning("Polling %s failed: %s", name, e)
+            if self.error_callback is not None:
+                self._notify(self.error_callback, name, e)
+            return None
+        finally:
+            with self._condition:
+                self._in_flight.discard(name)
+                if reschedule and self._running:
+                    self._schedule_at(time.monotonic() + self._next_delay(), name)
+        if self.callback is not None:
+            self._notify(self.callback, name, data)
+        else:
+            self._enqueue((name, data))
+        return data
+
+    def _notify(self, callback, name, arg):
+        # scheduled polls drop their future, an exception left in it would never be seen
+        try:
+            callback(name, arg)
+        except Exception:
+            logger.exception("Callback for %s failed", name)
+
+    def _enqueue(self, item):
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                # nobody is reading, keep the newest snapshots
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and (not self._schedule or self._schedule[0][0] > time.monotonic()):
+                    timeout = self._schedule[0][0] - time.monotonic() if self._schedule else None
+                    self._condition.wait(timeout)
+                if not self._running:
+                    return
+                _, name = heapq.heappop(self._schedule)
+            self._submit(name, reschedule=True)
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='stokercloud')
+        now = time.monotonic()
+        for name in self.clients:
+            # spread the first round over one interval
+            self._schedule_at(now + random.uniform(0, self.interval), name)
+        self._thread = threading.Thread(target=self._run, name='stokercloud-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        with self._condition:
+            self._running = False
+            self._schedule = []
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def snapshots(self, timeout: float = None):
+        """Yield (name, controller_data) pairs as polls complete."""
+        while True:
+            try:
+                yield self._queue.get(timeout=timeout)
+            except queue.Empty:
+                return
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
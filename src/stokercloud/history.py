@@ -0,0 +1,125 @@
+import math
+import threading
+import time
+from array import array
+from stokercloud.controller_data import FIELDS
+
+NAN = float('nan')
+
+
+class RingBuffer:
+    """Fixed capacity float buffer, the oldest sample is overwritten first."""
+    __slots__ = ('_data', '_start', '_size')
+
+    def __init__(self, capacity: int):
+        self._data = array('d', [NAN]) * capacity
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self):
+        return len(self._data)
+
+    def append(self, value):
+        capacity = len(self._data)
+        if self._size < capacity:
+            self._data[(self._start + self._size) % capacity] = value
+            self._size += 1
+        else:
+            self._data[self._start] = value
+            self._start = (self._start + 1) % capacity
+
+    def values(self, start=0):
+        """Samples from index `start` (0 is the oldest) to the newest."""
+        capacity = len(self._data)
+        begin = self._start + start
+        end = self._start + self._size
+        if end <= capacity:
+            return self._data[begin:end].tolist()
+        if begin >= capacity:
+            return self._data[begin - capacity:end - capacity].tolist()
+        return self._data[begin:].tolist() + self._data[:end - capacity].tolist()
+
+
+class History:
+    """The last `maxlen` samples of every numeric ControllerData field.
+
+    Pass an instance as Client(history=...) to record every fetched snapshot.
+    Missing readings are stored as NaN and skipped by the aggregates.
+    """
+
+    def __init__(self, maxlen: int = 360, fields=None):
+        self.maxlen = maxlen
+        self.fields = list(fields) if fields is not None else [field.name for field in FIELDS]
+        self._timestamps = RingBuffer(maxlen)
+        self._columns = {name: RingBuffer(maxlen) for name in self.fields}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    def append(self, controller_data, timestamp=None):
+        record = controller_data.to_dict()
+        with self._lock:
+            self._timestamps.append(time.time() if timestamp is None else timestamp)
+            for name, column in self._columns.items():
+                value = record.get(name)
+                column.append(NAN if value is None else value)
+
+    def _start_index(self, seconds, now):
+        if seconds is None:
+            return 0
+        timestamps = self._timestamps.values()
+        cutoff = (time.time() if now is None else now) - seconds
+        for index, timestamp in enumerate(timestamps):
+            if timestamp >= cutoff:
+                return index
+        return len(timestamps)
+
+    def window(self, field, seconds=None, now=None):
+        """(timestamp, value) pairs of the last `seconds`, or everything kept."""
+        with self._lock:
+            start = self._start_index(seconds, now)
+            return [
+                (timestamp, value)
+                for timestamp, value in zip(self._timestamps.values(start), self._columns[field].values(start))
+                if not math.isnan(value)
+            ]
+
+    def values(self, field, seconds=None, now=None):
+        return [value for _, value in self.window(field, seconds, now)]
+
+    def min(self, field, seconds=None, now=None):
+        values = self.values(field, seconds, now)
+        return min(values) if values else None
+
+    def max(self, field, seconds=None, now=None):
+        values = self.values(field, seconds, now)
+        return max(values) if values else None
+
+    def mean(self, field, seconds=None, now=None):
+        values = self.values(field, seconds, now)
+        return math.fsum(values) / len(values) if values else None
+
+    def rate(self, field, seconds=None, now=None, per: float = 3600, counter: bool = False):
+        """Change of `field` per `per` seconds (per hour by default).
+
+        With counter=True a drop in value is treated as a reset to zero, as
+        `consumption_day` does at midnight, so the rate stays positive.
+        """
+        samples = self.window(field, seconds, now)
+        if len(samples) < 2:
+            return None
+        elapsed = samples[-1][0] - samples[0][0]
+        if elapsed <= 0:
+            return None
+        if counter:
+            change = 0.0
+            for (_, previous), (_, value) in zip(samples, samples[1:]):
+                change += value - previous if value >= previous else value
+        else:
+            change = samples[-1][1] - samples[0][1]
+        return change / elapsed * per
@@ -0,0 +1,86 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from stokercloud.client import Client, TokenInvalid, token_invalid
+from stokercloud.controller_data import ControllerData, NotConnectedException, SECTIONS
+from stokercloud.decoding import decode_payload
+
+logger = logging.getLogger(__name__)
+
+
+def parse_record(raw, sections=SECTIONS):
+    """Decode a raw controllerdata2 body into a flat record of plain values.
+
+    Runs in a worker process, so it only takes and returns picklable builtins:
+    every field as a float or None plus the state name, alarm and running
+    flags. Returns None when the boiler is not connected.
+    """
+    data = decode_payload(raw, sections)
+    if token_invalid(200, data):
+        raise TokenInvalid("Token rejected")
+    try:
+        cd = ControllerData(data)
+    except NotConnectedException:
+        return None
+    record = cd.to_dict()
+    misc = data['miscdata']
+    record['state'] = cd.state
+    record['alarm'] = misc.get('alarm')
+    record['running'] = misc.get('running')
+    return record
+
+
+class IngestPipeline:
+    """Fetch raw payloads in I/O threads and parse them in a process pool.
+
+    Decoding JSON and extracting fields is CPU bound and holds the GIL, so at
+    fleet scale it is spread over `processes` worker processes (default: one
+    per core) while `io_workers` threads keep the requests going.
+    """
+
+    def __init__(self, accounts, io_workers: int = 8, processes: int = None, sections=SECTIONS,
+                 client_factory=Client):
+        self.clients = {}
+        for account in accounts:
+            client = account if isinstance(account, Client) else client_factory(account)
+            self.clients[client.name] = client
+        self.sections = sections
+        self._io = ThreadPoolExecutor(max_workers=io_workers)
+        self._processes = ProcessPoolExecutor(max_workers=processes)
+        self._rejected = {}
+
+    def _fetch_and_submit(self, client):
+        rejected = self._rejected.pop(client.name, None)
+        if rejected is not None:
+            client.refresh_token_once(rejected)
+        raw = client.fetch_raw()
+        return self._processes.submit(parse_record, raw, self.sections)
+
+    def poll(self):
+        """Poll every account once, returns {name: record or exception}."""
+        fetches = {name: self._io.submit(self._fetch_and_submit, client) for name, client in self.clients.items()}
+        results = {}
+        for name, fetch in fetches.items():
+            try:
+                record = fetch.result().result()
+            except TokenInvalid as e:
+                # the token was rejected inside a 200 response, the next fetch logs in again
+                self._rejected[name] = self.clients[name].token
+                results[name] = e
+            except Exception as e:
+                logger.warning("Ingesting %s failed: %s", name, e)
+                results[name] = e
+            else:
+                results[name] = record
+        return results
+
+    def close(self):
+        self._io.shutdown()
+        self._processes.shutdown()
+        for client in self.clients.values():
+            client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,119 @@
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class RetryPolicy:
+    """Bounded retries with full-jitter exponential backoff."""
+
+    def __init__(self, attempts: int = 3, base_delay: float = 0.5, max_delay: float = 30,
+                 retry_statuses=(429, 500, 502, 503, 504), sleep=time.sleep):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = frozenset(retry_statuses)
+        self.sleep = sleep
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def backoff(self, attempt):
+        self.sleep(self.delay(attempt))
+
+
+class CircuitBreaker:
+    """Stop calling a host after `failure_threshold` consecutive failures.
+
+    Once open, requests fail fast with CircuitOpen for `reset_timeout` seconds,
+    then a single trial request is let through; its outcome closes the circuit
+    or opens it again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return
+            raise CircuitOpen("Circuit open, retry in %.0fs" % (self.reset_timeout - (self.clock() - self.opened_at)))
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(url, **kwargs):
+    """The CircuitBreaker shared by every client talking to the host of `url`."""
+    host = urlsplit(url).netloc
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = _breakers[host] = CircuitBreaker(**kwargs)
+        return breaker
+
+
+class TokenBucket:
+    """Allow `rate` requests per second with bursts of up to `capacity`.
+
+    Share one instance between clients to cap the load of a whole fleet.
+    """
+
+    def __init__(self, rate: float, capacity: float = None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        # returns how long to wait before a token is available, 0 when one was taken
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def try_acquire(self):
+        return self._take() == 0
+
+    def acquire(self):
+        while True:
+            wait = self._take()
+            if wait == 0:
+                return
+            self.sleep(wait)
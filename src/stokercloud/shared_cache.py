@@ -0,0 +1,57 @@
+import contextlib
+import os
+import struct
+import threading
+from urllib.parse import quote
+from stokercloud.files import atomic_write, file_lock
+
+# fetch time in seconds since the epoch, followed by the raw response body
+ENTRY_HEADER = struct.Struct('<d')
+
+
+class SharedCache:
+    """Raw controllerdata2 payloads shared by every process on a host.
+
+    Pass an instance as Client(cache=...). Each account is one file in
+    `directory`, replaced atomically, so readers never see a partial write.
+    Refreshes take an flock on a per-account lock file: the first process to
+    find the entry expired fetches it, the others wait and then read the new
+    entry. Where fcntl is not available the lock only covers this process.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _path(self, name, suffix):
+        return os.path.join(self.directory, quote(name, safe='') + suffix)
+
+    def get(self, name):
+        """Return (fetched, body) or None."""
+        try:
+            with open(self._path(name, '.payload'), 'rb') as fh:
+                raw = fh.read()
+        except OSError:
+            return None
+        if len(raw) < ENTRY_HEADER.size:
+            return None
+        return ENTRY_HEADER.unpack_from(raw)[0], raw[ENTRY_HEADER.size:]
+
+    def set(self, name, body, fetched):
+        atomic_write(self._path(name, '.payload'), ENTRY_HEADER.pack(fetched) + body)
+
+    def discard(self, name):
+        try:
+            os.unlink(self._path(name, '.payload'))
+        except FileNotFoundError:
+            pass
+
+    @contextlib.contextmanager
+    def lock(self, name):
+        """Exclusive lock on `name`, across processes when fcntl is available."""
+        with self._locks_lock:
+            local = self._locks.setdefault(name, threading.Lock())
+        with local, file_lock(self._path(name, '.lock')):
+            yield
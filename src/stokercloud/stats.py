@@ -0,0 +1,102 @@
+import threading
+from bisect import bisect_left
+
+# seconds, roughly the spread of StokerCloud response times
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DECODE_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """(upper bound, cumulative count) pairs, Prometheus style."""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def as_dict(self):
+        return {'count': self.count, 'sum': self.sum, 'buckets': self.cumulative()}
+
+
+class ClientStats:
+    """Counters and histograms recorded by Client(stats=...).
+
+    One instance can be shared by every client of a fleet. Each record call
+    takes a lock and does a bisect, so it can stay on in production.
+    """
+
+    def __init__(self, latency_buckets=LATENCY_BUCKETS, decode_buckets=DECODE_BUCKETS):
+        self._latency_buckets = latency_buckets
+        self.latency = {}  # kind ('login', 'request') -> Histogram
+        self.decode_time = Histogram(decode_buckets)
+        self.requests = 0
+        self.errors = 0
+        self.bytes_received = 0
+        self.token_refreshes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_stale = 0
+        self._lock = threading.Lock()
+
+    def record_request(self, kind, seconds, size, error=False):
+        with self._lock:
+            histogram = self.latency.get(kind)
+            if histogram is None:
+                histogram = self.latency[kind] = Histogram(self._latency_buckets)
+            histogram.observe(seconds)
+            self.requests += 1
+            self.bytes_received += size
+            if error:
+                self.errors += 1
+
+    def record_decode(self, seconds):
+        with self._lock:
+            self.decode_time.observe(seconds)
+
+    def record_token_refresh(self):
+        with self._lock:
+            self.token_refreshes += 1
+
+    def record_cache(self, hit, stale=False):
+        with self._lock:
+            if stale:
+                self.cache_stale += 1
+            elif hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    @property
+    def cache_hit_rate(self):
+        served = self.cache_hits + self.cache_stale
+        total = served + self.cache_misses
+        return served / total if total else None
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'bytes_received': self.bytes_received,
+                'token_refreshes': self.token_refreshes,
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+                'cache_stale': self.cache_stale,
+                'latency': {kind: histogram.as_dict() for kind, histogram in self.latency.items()},
+                'decode_time': self.decode_time.as_dict(),
+            }
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import threading
+from stokercloud.controller_data import ChangeTracker, PowerState
+
+logger = logging.getLogger(__name__)
+
+# ignition and alarms change quickly, idle boilers barely at all
+FAST_STATES = frozenset(['ROZPALANIE_1', 'ROZPALANIE_2', 'BLAD_ROZPAL'])
+SLOW_STATES = frozenset(['WYLACZONY', 'CZUW_Harmon', 'CZUW_TempOsiag', 'ZATRZYM_TempOsiag'])
+
+
+class AdaptiveInterval:
+    """Seconds until the next poll, chosen from the last snapshot."""
+
+    def __init__(self, normal: float = 30, fast: float = 10, slow: float = 120):
+        self.normal = normal
+        self.fast = fast
+        self.slow = slow
+
+    def __call__(self, controller_data):
+        if controller_data is None:
+            return self.normal
+        if controller_data.alarm == PowerState.on or controller_data.state in FAST_STATES:
+            return self.fast
+        if controller_data.state in SLOW_STATES:
+            return self.slow
+        return self.normal
+
+
+class Subscription:
+    def __init__(self, hub, callback, changes_only=False, deadbands=None):
+        self.hub = hub
+        self.callback = callback
+        # changes_only subscribers get a dict of changed fields instead of the snapshot
+        self.tracker = ChangeTracker(deadbands) if changes_only else None
+
+    def dispatch(self, controller_data):
+        if self.tracker is None:
+            self.callback(controller_data)
+            return
+        changes = self.tracker.update(controller_data)
+        if changes:
+            self.callback(changes)
+
+    def cancel(self):
+        self.hub.unsubscribe(self)
+
+
+class SubscriptionHub:
+    """One poll loop per Client, fanned out to any number of subscribers.
+
+    The loop runs in a daemon thread while at least one subscription is
+    active and sleeps `interval(last_snapshot)` seconds between polls.
+    """
+
+    def __init__(self, client, interval=None, error_callback=None):
+        self.client = client
+        self.interval = interval if interval is not None else AdaptiveInterval()
+        self.error_callback = error_callback
+        self.last = None
+        self._subscriptions = []
+        self._lock = threading.Lock()
+        self._stop = None
+        self._thread = None
+
+    def subscribe(self, callback, changes_only=False, deadbands=None):
+        subscription = Subscription(self, callback, changes_only, deadbands)
+        with self._lock:
+            self._subscriptions.append(subscription)
+            if self._thread is None:
+                self._stop = threading.Event()
+                self._thread = threading.Thread(
+                    target=self._run, args=(self._stop,), name='stokercloud-%s' % self.client.name, daemon=True
+                )
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+            if not self._subscriptions and self._thread is not None:
+                self._stop.set()
+                self._thread = None
+
+    def stop(self):
+        with self._lock:
+            self._subscriptions = []
+            if self._thread is not None:
+                self._stop.set()
+                self._thread = None
+
+    def _run(self, stop):
+        while not stop.is_set():
+            try:
+                self.last = self.client.fetch_controller_data()
+            except Exception as e:
+                logger.warning("Polling %s failed: %s", self.client.name, e)
+                if self.error_callback is not None:
+                    self.error_callback(e)
+            else:
+                with self._lock:
+                    subscriptions = list(self._subscriptions)
+                for subscription in subscriptions:
+                    try:
+                        subscription.dispatch(self.last)
+                    except Exception:
+                        logger.exception("Subscriber of %s failed", self.client.name)
+            stop.wait(self.interval(self.last))
+
+    async def stream(self, changes_only=False, deadbands=None, max_pending=100):
+        """Async iterator over snapshots (or change dicts) from the poll loop.
+
+        At most `max_pending` items wait for a slow consumer; past that the
+        oldest is dropped.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=max_pending)
+
+        def put(item):
+            if queue.full():
+                # keep the newest items
+                queue.get_nowait()
+            queue.put_nowait(item)
+
+        subscription = self.subscribe(lambda item: loop.call_soon_threadsafe(put, item), changes_only, deadbands)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            subscription.cancel()
@@ -0,0 +1,152 @@
+"""A local stand-in for www.stokercloud.dk, for tests and benchmarks."""
+import gzip
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+def make_items(prefix, values):
+    return [
+        {"id": _id, "value": value, "unit": "", "name": "lng_%s_%s" % (prefix, _id), "selection": ""}
+        for _id, value in values
+    ]
+
+
+def sample_payload(**overrides):
+    data = {
+        "weatherdata": make_items("weather", [("1", "0.8"), ("2", "1.96"), ("3", "E")]),
+        "frontdata": make_items("front", [
+            ("boilertemp", "59.9"), ("-wantedboilertemp", "62.0"), ("dhw", 54.9), ("dhwwanted", "57"),
+            ("refoxygen", "20.9"), ("smoketemp", 120.44), ("refair", "0"), ("hopperdistance", "40"),
+            ("pressure", "12"), ("exhaust", "35"), ("ashdist", "10"),
+        ]),
+        "boilerdata": make_items("boil", [
+            ("5", "3.8"), ("4", "14"), ("6", "100"), ("12", "17.6"), ("14", "100"), ("15", "100"),
+            ("16", "100"), ("9", "99.8"), ("17", "45.5"), ("7", 31.26),
+        ]),
+        "hopperdata": make_items("hopper", [
+            ("1", "120"), ("2", "1300"), ("3", "27.7"), ("4", "1499"), ("5", "300"), ("13", "80"),
+            ("7", "3.0"), ("8", "20"), ("9", "0"), ("10", "0"),
+        ]),
+        "dhwdata": make_items("dhw", [("3", "6"), ("4", "N/A")]),
+        "miscdata": {
+            "state": {"id": "state", "value": "lng_state_5"},
+            "clock": {"id": "clock", "value": "22:30"},
+            "alarm": 0,
+            "running": 1,
+            "hopper.distance_max": "50",
+        },
+        "leftoutput": {
+            "output-%d" % i: {"val": val, "unit": ""}
+            for i, val in enumerate(["OFF", "ON", "0", "OFF", "40", "disabled", "0", "disabled", "OFF"], 1)
+        },
+        "weathercomp": {
+            "zone1active": 1,
+            "zone2active": 0,
+            "zone1-wanted": {"val": 35, "unit": "LNG_DEGREE"},
+            "zone1-actual": {"val": 34.26, "unit": "LNG_DEGREE"},
+            "zone1-valve": {"val": "40", "unit": "LNG_PERCENT"},
+            "zone1-actualref": {"val": "0.8", "unit": "LNG_DEGREE"},
+            "zone1-calc": {"val": 0.3, "unit": "LNG_DEGREE"},
+            "zone2-wanted": {"val": "0.0", "unit": "LNG_DEGREE"},
+            "zone2-actual": {"val": "999.9", "unit": "LNG_DEGREE"},
+            "zone2-valve": {"val": "0", "unit": "LNG_PERCENT"},
+            "zone2-actualref": {"val": "0.8", "unit": "LNG_DEGREE"},
+            "zone2-calc": {"val": "0.3", "unit": "LNG_DEGREE"},
+        },
+        "notconnected": 0,
+        "serial": "12345",
+    }
+    data.update(overrides)
+    return data
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        status = 200
+        if 'login.php' in self.path:
+            body = {"token": "token-%d" % len(self.server.requests), "credentials": "readonly"}
+        elif self.server.redirect_to:
+            status, body = 302, {}
+            location = self.server.redirect_to + self.path.lstrip('/')
+        elif self.server.failures:
+            self.server.failures -= 1
+            status, body = 503, {"error": "unavailable"}
+        elif self.path.rpartition('token=')[2] in self.server.revoked_tokens:
+            status, body = 401, {"error": "invalid token"}
+        else:
+            body = self.server.payload
+        raw = json.dumps(body).encode()
+        # close without announcing it, like an idle keep-alive timeout
+        self.close_connection = self.server.drop_connections
+        headers = {'Content-Type': 'application/json'}
+        if status == 302:
+            headers['Location'] = location
+        if self.server.etags and status == 200:
+            headers['ETag'] = '"%s"' % hashlib.sha1(raw).hexdigest()
+            if self.headers.get('If-None-Match') == headers['ETag']:
+                status, raw = 304, b''
+        if raw and self.server.gzip and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            raw = gzip.compress(raw)
+            headers['Content-Encoding'] = 'gzip'
+        headers['Content-Length'] = str(len(raw))
+        self.server.bytes_sent += len(raw)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    """Serves login.php and controllerdata2.php on a local port.
+
+    The knobs below let tests misbehave on purpose: `failures` answers that
+    many data requests with 503, `revoked_tokens` get a 401 and
+    `drop_connections` closes keep-alive connections after each response.
+    `redirect_to`, a base URL, answers data requests with a 302 to it.
+    Set `etags` or `gzip` to False for a server without ETags or compression.
+    """
+    daemon_threads = True
+
+    def __init__(self, payload=None, address=('127.0.0.1', 0)):
+        super().__init__(address, StandInHandler)
+        self.payload = payload if payload is not None else sample_payload()
+        self.connections = 0
+        self.requests = []
+        self.revoked_tokens = set()
+        self.etags = True
+        self.gzip = True
+        self.bytes_sent = 0
+        self.failures = 0
+        self.redirect_to = None
+        self.drop_connections = False
+        self.base_url = 'http://%s:%d/' % self.server_address[:2]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -1,7 +1,58 @@
+import asyncio
+import concurrent.futures
+import decimal
 import json
+import os
+import pickle
+import threading
+import timeit
+import urllib.request
 import pytest
 
-from stokercloud.controller_data import ControllerData, PowerState, NotConnectedException, Unit, Value, State
+from stokercloud import decoding
+from stokercloud.async_client import AsyncClient, ConnectionPool
+from stokercloud.alerts import AlertPlan, Rule
+from stokercloud.archive import ArchiveReader, ArchiveWriter
+from stokercloud.batch import STATES, SnapshotBatch
+from stokercloud.client import Client, TokenInvalid, token_invalid
+from stokercloud.controller_data import (
+    ControllerData, ChangeTracker, PowerState, NotConnectedException, Unit, Value, State, get_from_list_by_key,
+    FIELDS, DISCRETE_FIELDS, SECTIONS, Screen, DEFAULT_SCREEN, FieldNotRequested
+)
+from stokercloud.derived import DerivedMetrics, EWMA
+from stokercloud.exporter import Exporter, MetricsServer
+from stokercloud.fleet import FleetPoller
+from stokercloud.history import History, RingBuffer
+from stokercloud.ingest import IngestPipeline, parse_record
+from stokercloud.resilience import CircuitBreaker, CircuitOpen, RetryPolicy, TokenBucket
+from stokercloud.shared_cache import SharedCache
+from stokercloud.stats import ClientStats, Histogram
+from stokercloud.subscription import AdaptiveInterval
+from stokercloud.testing import StandInServer, make_items, sample_payload
+from stokercloud.tokens import TokenCache
+from stokercloud.transport import HTTPError, HTTPTransport, RecordingTransport, ReplayTransport, UrllibTransport
+
+ALL_VALUE_PROPERTIES = [
+    'boiler_temperature_current', 'boiler_temperature_requested', 'hotwater_temperature_current',
+    'hotwater_temperature_requested', 'oxygen_reference', 'smoke_temperature', 'airflow',
+    'hopper_distance', 'pressure', 'exhaust', 'ashdist', 'boiler_kwh', 'boiler_percent',
+    'oxygen_current', 'oxygen_low', 'oxygen_mid', 'oxygen_high', 'boiler_temp_return',
+    'boiler_temp_dropshaft', 'consumption_total', 'consumption_day', 'auger_capacity',
+    'hopper_content', 'hopper_trip1', 'hopper_trip2', 'power_10_percent', 'power_100_percent',
+    'dhw_difference_under', 'zone1_flow_wanted', 'zone1_flow_current', 'zone1_current_temperature',
+    'zone1_avarage_temperature', 'zone2_flow_wanted', 'zone2_flow_current',
+    'zone2_current_temperature', 'zone2_avarage_temperature',
+]
+
+
+@pytest.fixture
+def stokercloud_server():
+    with StandInServer() as server:
+        yield server
+
+
+def extract_all(cd):
+    return [getattr(cd, name) for name in ALL_VALUE_PROPERTIES]
 
 
 def test_controller_data():
@@ -379,4 +430,1050 @@ def test_controller_data():
 def test_controller_data_connected():
     test_data = '{"notconnected": 1}'
     with pytest.raises(NotConnectedException):
-        ControllerData(json.loads(test_data))
\ No newline at end of file
+        ControllerData(json.loads(test_data))
+
+class LinearScanControllerData(ControllerData):
+    def get_sub_item(self, submenu, _id):
+        return get_from_list_by_key(self.data[submenu], 'id', _id)
+
+
+def test_indexed_lookup_matches_linear_scan():
+    data = sample_payload()
+    assert extract_all(ControllerData(data)) == extract_all(LinearScanControllerData(data))
+
+
+def test_to_dict_matches_properties():
+    cd = ControllerData(sample_payload())
+    record = cd.to_dict()
+    assert set(record) == {field.name for field in FIELDS}
+    for name in ALL_VALUE_PROPERTIES:
+        assert record[name] == float(getattr(cd, name).value), name
+    assert record['smoke_temperature'] == 120.4
+    assert ControllerData(sample_payload(dhwdata=[])).to_dict()['dhw_difference_under'] is None
+    # non-numeric outputs are reported as missing rather than raising
+    leftoutput = dict(sample_payload()['leftoutput'], **{'output-7': {'val': 'disabled'}})
+    assert ControllerData(sample_payload(leftoutput=leftoutput)).to_dict()['compressor_cleaning'] is None
+
+
+def test_as_record_carries_units():
+    record = ControllerData(sample_payload()).as_record()
+    assert record['boiler_kwh'] == (3.8, Unit.KWH)
+    assert record['auger_capacity'] == (1300.0, Unit.GRAM)
+
+
+def test_async_client_shares_connections(stokercloud_server):
+    async def poll():
+        pool = ConnectionPool(limit=2)
+        clients = [AsyncClient('boiler-%d' % i, pool=pool) for i in range(6)]
+        for client in clients:
+            client.BASE_URL = stokercloud_server.base_url
+        results = await asyncio.gather(*[client.controller_data() for client in clients])
+        # served from the cache, no new requests
+        await clients[0].controller_data()
+        pool.close()
+        return results
+
+    results = asyncio.run(poll())
+    assert [cd.serial_number for cd in results] == ["12345"] * 6
+    assert len(stokercloud_server.requests) == 12
+    assert stokercloud_server.connections <= 2
+
+
+def test_async_client_refreshes_single_flight(stokercloud_server):
+    async def poll():
+        client = AsyncClient('boiler', pool=ConnectionPool(limit=5))
+        client.BASE_URL = stokercloud_server.base_url
+        results = await asyncio.gather(*[client.controller_data() for _ in range(5)])
+        client.pool.close()
+        return results
+
+    results = asyncio.run(poll())
+    assert [cd.serial_number for cd in results] == ["12345"] * 5
+    assert len(_logins(stokercloud_server)) == 1
+    assert len(_controller_requests(stokercloud_server)) == 1
+
+
+def test_async_client_refreshes_rejected_token(stokercloud_server):
+    async def poll():
+        client = AsyncClient('boiler', cache_time_seconds=0)
+        client.BASE_URL = stokercloud_server.base_url
+        await client.controller_data()
+        stokercloud_server.revoked_tokens.add(client.token)
+        assert (await client.controller_data()).serial_number == "12345"
+        # a token rejected in a 200 response body, also after the refresh
+        stokercloud_server.payload = {"error": "invalid token"}
+        with pytest.raises(TokenInvalid):
+            await client.controller_data()
+        client.pool.close()
+
+    asyncio.run(poll())
+    assert len(_logins(stokercloud_server)) == 3
+
+
+def test_connection_pool_survives_a_new_event_loop(stokercloud_server):
+    pool = ConnectionPool(limit=2)
+    client = AsyncClient('boiler', cache_time_seconds=0, pool=pool)
+    client.BASE_URL = stokercloud_server.base_url
+    for _ in range(2):
+        assert asyncio.run(client.controller_data()).serial_number == "12345"
+    assert stokercloud_server.connections == 2
+    pool.close()
+
+
+@pytest.mark.parametrize('transport', [HTTPTransport, UrllibTransport])
+def test_client_transports(stokercloud_server, transport):
+    client = Client('boiler', cache_time_seconds=0, transport=transport(timeout=5))
+    client.BASE_URL = stokercloud_server.base_url
+    for _ in range(3):
+        assert client.controller_data().serial_number == "12345"
+    client.close()
+    assert len(stokercloud_server.requests) == 4
+    assert stokercloud_server.connections == (1 if transport is HTTPTransport else 4)
+
+
+@pytest.mark.parametrize('transport', [HTTPTransport, UrllibTransport])
+def test_client_transports_follow_redirects(stokercloud_server, transport):
+    with StandInServer() as moved:
+        stokercloud_server.redirect_to = moved.base_url
+        client = Client('boiler', transport=transport(timeout=5))
+        client.BASE_URL = stokercloud_server.base_url
+        assert client.controller_data().serial_number == "12345"
+        assert len(_controller_requests(moved)) == 1
+        client.close()
+
+
+def test_http_error_hides_token():
+    error = HTTPError(503, 'http://example.com/controllerdata2.php?screen=b1&token=secret')
+    assert 'secret' not in str(error)
+    assert error.url == 'http://example.com/controllerdata2.php?screen=b1'
+
+
+def test_http_transport_reconnects_stale_socket(stokercloud_server):
+    transport = HTTPTransport(timeout=5)
+    url = stokercloud_server.base_url + 'v2/dataout2/login.php?user=boiler'
+    stokercloud_server.drop_connections = True
+    assert transport.request(url).status == 200
+    stokercloud_server.drop_connections = False
+    assert transport.request(url).status == 200
+    transport.close()
+    assert stokercloud_server.connections == 2
+
+
+def test_fleet_poller(stokercloud_server):
+    clients = []
+    for i in range(20):
+        client = Client('boiler-%d' % i, cache_time_seconds=0)
+        client.BASE_URL = stokercloud_server.base_url
+        clients.append(client)
+
+    poller = FleetPoller(clients, interval=0.2, max_workers=4)
+    with poller:
+        seen = {}
+        for name, data in poller.snapshots(timeout=5):
+            seen.setdefault(name, []).append(data)
+            if len(seen) == 20 and all(len(polls) >= 2 for polls in seen.values()):
+                break
+    assert {data.serial_number for polls in seen.values() for data in polls} == {"12345"}
+    assert stokercloud_server.connections <= 20
+
+
+def test_fleet_poller_deduplicates_in_flight(stokercloud_server):
+    release = threading.Event()
+
+    class SlowClient(Client):
+        def controller_data(self):
+            release.wait(5)
+            return super().controller_data()
+
+    client = SlowClient('boiler', cache_time_seconds=0)
+    client.BASE_URL = stokercloud_server.base_url
+    poller = FleetPoller([client], interval=60, max_workers=4)
+    poller.start()
+    try:
+        first = poller.submit('boiler')
+        assert poller.submit('boiler') is None
+        release.set()
+        assert first.result(5).serial_number == "12345"
+    finally:
+        poller.stop()
+
+
+def test_fleet_poller_submit_requires_start_and_bounds_queue(stokercloud_server):
+    client = Client('boiler', cache_time_seconds=0)
+    client.BASE_URL = stokercloud_server.base_url
+    poller = FleetPoller([client], interval=60, max_pending=1)
+    with pytest.raises(RuntimeError):
+        poller.submit('boiler')
+    poller.start()
+    try:
+        for _ in range(3):
+            poller.submit('boiler').result(5)
+    finally:
+        poller.stop()
+    assert len(list(poller.snapshots(timeout=0))) == 1
+
+
+def test_fleet_poller_logs_callback_errors(stokercloud_server, caplog):
+    def callback(name, data):
+        raise RuntimeError("subscriber bug")
+
+    client = Client('boiler', cache_time_seconds=0)
+    client.BASE_URL = stokercloud_server.base_url
+    poller = FleetPoller([client], interval=0.05, jitter=0, callback=callback)
+    with poller:
+        assert _wait_for(lambda: any(r.exc_info and 'subscriber bug' in str(r.exc_info[1]) for r in caplog.records))
+    assert 'Callback for boiler failed' in caplog.text
+
+
+def _logins(server):
+    return [path for path in server.requests if 'login.php' in path]
+
+
+def test_client_refreshes_rejected_token_once(stokercloud_server):
+    client = Client('boiler', cache_time_seconds=0)
+    client.BASE_URL = stokercloud_server.base_url
+    client.token = 'expired'
+    stokercloud_server.revoked_tokens.add('expired')
+
+    barrier = threading.Barrier(8)
+
+    def poll():
+        barrier.wait()
+        return client.make_request('v16bckbeta/dataout2/controllerdata2.php?')
+
+    threads = [threading.Thread(target=poll) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(_logins(stokercloud_server)) == 1
+    assert client.token != 'expired'
+
+
+def test_client_gives_up_when_fresh_token_is_rejected(stokercloud_server):
+    class RejectingClient(Client):
+        def refresh_token(self):
+            super().refresh_token()
+            stokercloud_server.revoked_tokens.add(self.token)
+
+    client = RejectingClient('boiler')
+    client.BASE_URL = stokercloud_server.base_url
+    with pytest.raises(TokenInvalid):
+        client.controller_data()
+    assert len(_logins(stokercloud_server)) == 2
+
+
+def test_client_proactive_refresh_and_token_cache(stokercloud_server, tmp_path):
+    cache = TokenCache(str(tmp_path / 'tokens.json'))
+    client = Client('boiler', cache_time_seconds=0, token_ttl=3600, token_cache=cache)
+    client.BASE_URL = stokercloud_server.base_url
+    client.controller_data()
+    assert cache.get('boiler')[0] == client.token
+
+    # a new process picks the token up from disk instead of logging in
+    restarted = Client('boiler', cache_time_seconds=0, token_ttl=3600, token_cache=cache)
+    restarted.BASE_URL = stokercloud_server.base_url
+    restarted.controller_data()
+    assert restarted.token == client.token
+    assert len(_logins(stokercloud_server)) == 1
+
+    # close to expiry the token is refreshed before it is used
+    restarted.token_issued -= 3590
+    cache.discard('boiler')
+    restarted.controller_data()
+    assert restarted.token != client.token
+    assert len(_logins(stokercloud_server)) == 2
+
+
+def _store_tokens(path, worker):
+    cache = TokenCache(path)
+    for i in range(20):
+        cache.set('boiler-%d-%d' % (worker, i), 'token', 'readonly', 0.0)
+
+
+def test_token_cache_keeps_entries_of_other_processes(tmp_path):
+    path = str(tmp_path / 'tokens.json')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(_store_tokens, [path] * 4, range(4)))
+    cache = TokenCache(path)
+    assert all(cache.get('boiler-%d-%d' % (worker, i)) for worker in range(4) for i in range(20))
+
+
+def _controller_requests(server):
+    return [path for path in server.requests if 'controllerdata2.php' in path]
+
+
+def test_controller_data_cache_is_single_flight(stokercloud_server):
+    client = Client('boiler', cache_time_seconds=60)
+    client.BASE_URL = stokercloud_server.base_url
+    barrier = threading.Barrier(10)
+
+    def poll():
+        barrier.wait()
+        client.controller_data()
+
+    threads = [threading.Thread(target=poll) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(_controller_requests(stokercloud_server)) == 1
+
+
+def test_controller_data_stale_while_revalidate(stokercloud_server):
+    client = Client('boiler', cache_time_seconds=60, stale_while_revalidate=True)
+    client.BASE_URL = stokercloud_server.base_url
+    client.controller_data()
+    first_fetch = client.last_fetch
+
+    client.last_fetch -= 120
+    stokercloud_server.payload = sample_payload(serial="67890")
+    # the stale snapshot is served while one refresh runs in the background
+    assert client.controller_data().serial_number == "12345"
+    assert client.controller_data().serial_number in ("12345", "67890")
+    with client._data_lock:
+        pass
+    assert client.last_fetch > first_fetch
+    assert client.controller_data().serial_number == "67890"
+    assert len(_controller_requests(stokercloud_server)) == 2
+
+
+def test_value_is_immutable_hashable_and_orderable():
+    value = Value("59.9", Unit.DEGREE)
+    with pytest.raises(AttributeError):
+        value.value = 1
+    assert not hasattr(value, '__dict__')
+    assert len({value, Value("59.90", Unit.DEGREE), Value("59.9", Unit.KWH)}) == 2
+    assert Value("1", Unit.DEGREE) < value <= Value("60", Unit.DEGREE)
+    with pytest.raises(TypeError):
+        value < Value("1", Unit.KWH)
+    assert pickle.loads(pickle.dumps(value)) == value
+
+
+def test_value_arithmetic():
+    a, b = Value("1.1", Unit.KILO_GRAM), Value("2.2", Unit.KILO_GRAM)
+    assert a + b == Value("3.3", Unit.KILO_GRAM)
+    assert b - a == Value("1.1", Unit.KILO_GRAM)
+    assert (a * 2, 2 * a) == (Value("2.2", Unit.KILO_GRAM),) * 2
+    assert (b / 2).value == decimal.Decimal("1.1")
+    with pytest.raises(TypeError):
+        a + Value("1", Unit.GRAM)
+    mixed = a + Value(2.2, Unit.KILO_GRAM, exact=False)
+    assert not mixed.exact
+    assert mixed.value == pytest.approx(3.3)
+
+
+def test_controller_data_float_values():
+    exact = ControllerData(sample_payload())
+    fast = ControllerData(sample_payload(), exact=False)
+    assert isinstance(exact.smoke_temperature.value, decimal.Decimal)
+    assert fast.smoke_temperature == Value(120.4, Unit.DEGREE, exact=False)
+    for name in ALL_VALUE_PROPERTIES:
+        assert float(getattr(fast, name)) == float(getattr(exact, name)), name
+
+
+def test_ring_buffer_wraps():
+    buffer = RingBuffer(3)
+    for value in range(5):
+        buffer.append(value)
+    assert len(buffer) == 3
+    assert buffer.values() == [2.0, 3.0, 4.0]
+    assert buffer.values(1) == [3.0, 4.0]
+
+
+def _hopper_payload(content, day):
+    hopperdata = [item for item in sample_payload()['hopperdata'] if item['id'] not in ('1', '3')]
+    hopperdata += make_items('hopper', [('1', str(content)), ('3', str(day))])
+    return sample_payload(hopperdata=hopperdata)
+
+
+def test_history_aggregates_and_rates():
+    history = History(maxlen=4)
+    # half-hourly samples, consumption_day resets at midnight between 2 and 3
+    for i, (content, day) in enumerate([(100, 10), (98, 11), (96, 12), (94, 1), (92, 2)]):
+        history.append(ControllerData(_hopper_payload(content, day)), timestamp=1800 * i)
+    assert len(history) == 4
+    assert history.values('hopper_content') == [98.0, 96.0, 94.0, 92.0]
+    assert (history.min('hopper_content'), history.max('hopper_content')) == (92.0, 98.0)
+    assert history.mean('hopper_content') == 95.0
+    assert history.values('hopper_content', seconds=1800, now=7200) == [94.0, 92.0]
+    assert history.rate('hopper_content') == -4.0
+    assert history.rate('consumption_day', counter=True) == 2.0
+
+
+def test_client_feeds_history(stokercloud_server):
+    history = History(maxlen=10, fields=['boiler_kwh'])
+    client = Client('boiler', cache_time_seconds=0, history=history)
+    client.BASE_URL = stokercloud_server.base_url
+    client.controller_data()
+    client.controller_data()
+    assert history.values('boiler_kwh') == [3.8, 3.8]
+
+
+def _with_smoke_temperature(value):
+    frontdata = [dict(item) for item in sample_payload()['frontdata']]
+    for item in frontdata:
+        if item['id'] == 'smoketemp':
+            item['value'] = value
+    return ControllerData(sample_payload(frontdata=frontdata))
+
+
+def test_controller_data_diff():
+    previous = _with_smoke_temperature(120.0)
+    assert previous.diff(_with_smoke_temperature(120.0)) == {}
+    assert previous.diff(None) == previous.change_record()
+    assert _with_smoke_temperature(120.3).diff(previous) == {'smoke_temperature': 120.3}
+    assert _with_smoke_temperature(120.1).diff(previous, deadbands={'smoke_temperature': 0.5}) == {}
+
+
+def test_change_tracker_deadband_accumulates_drift():
+    tracker = ChangeTracker(deadbands={'smoke_temperature': 0.5})
+    assert len(tracker.update(_with_smoke_temperature(120.0))) == len(FIELDS) + len(DISCRETE_FIELDS)
+    assert tracker.update(_with_smoke_temperature(120.3)) == {}
+    assert tracker.update(_with_smoke_temperature(120.6)) == {'smoke_temperature': 120.6}
+    assert tracker.update(_with_smoke_temperature(120.9)) == {}
+
+
+def test_diff_reports_state_alarm_and_outputs():
+    previous = ControllerData(sample_payload())
+    misc = dict(sample_payload()['miscdata'], state={'id': 'state', 'value': State.BLAD_ROZPAL.value}, alarm=1)
+    failed = ControllerData(sample_payload(miscdata=misc))
+    assert failed.diff(previous) == {'state': 'BLAD_ROZPAL', 'alarm': 1}
+    tracker = ChangeTracker()
+    tracker.update(previous)
+    assert tracker.update(failed) == {'state': 'BLAD_ROZPAL', 'alarm': 1}
+    leftoutput = dict(sample_payload()['leftoutput'], **{'output-1': {'val': 'ON', 'unit': ''}})
+    assert tracker.update(ControllerData(sample_payload(leftoutput=leftoutput, miscdata=misc))) == {'dhw_pump': 'on'}
+
+
+def test_decode_payload_keeps_selected_sections():
+    raw = json.dumps(sample_payload()).encode()
+    data = decoding.decode_payload(raw, SECTIONS)
+    assert 'weatherdata' not in data
+    assert ControllerData(data).to_dict() == ControllerData(sample_payload()).to_dict()
+    assert set(decoding.decode_payload(raw, {'serial'})) == {'serial', 'notconnected'}
+
+
+def test_decode_payload_keeps_token_errors():
+    data = decoding.decode_payload(b'{"error": "invalid token"}', SECTIONS)
+    assert data == {'error': 'invalid token'}
+    assert token_invalid(200, data)
+
+
+def test_decode_payload_without_fast_backend(monkeypatch):
+    monkeypatch.setattr(decoding, 'orjson', None)
+    raw = json.dumps(sample_payload()).encode()
+    assert decoding.decode_payload(raw) == sample_payload()
+
+
+def test_client_requests_selected_sections(stokercloud_server):
+    client = Client('boiler', sections=SECTIONS)
+    client.BASE_URL = stokercloud_server.base_url
+    assert client.controller_data().serial_number == "12345"
+    assert 'weatherdata' not in client.cached_data
+
+
+def test_screen_query():
+    screen = Screen.for_fields(['oxygen_current', 'hopper_content', 'smoke_temperature'])
+    assert screen.ids == {'boilerdata': ('12',), 'dhwdata': (), 'hopperdata': ('1',), 'weatherdata': ()}
+    assert screen.query().startswith('screen=b1%2C12%2Cb2%2C0%2C')
+    assert 'h1%2C1%2Ch2%2C0' in screen.query()
+    assert DEFAULT_SCREEN.query().startswith('screen=b1%2C17%2Cb2%2C5%2C')
+    with pytest.raises(ValueError):
+        Screen(weather=range(6))
+
+
+def test_controller_data_knows_requested_fields(stokercloud_server):
+    screen = Screen.for_fields(['oxygen_current'])
+    client = Client('boiler', screen=screen)
+    client.BASE_URL = stokercloud_server.base_url
+    cd = client.controller_data()
+    assert 'screen=b1%2C12%2Cb2%2C0' in _controller_requests(stokercloud_server)[0]
+    assert cd.oxygen_current == Value("17.6", Unit.PERCENT)
+    assert cd.smoke_temperature == Value("120.4", Unit.DEGREE)
+    assert not cd.requested('boiler_kwh')
+    with pytest.raises(FieldNotRequested):
+        cd.boiler_kwh
+    assert 'boiler_kwh' not in cd.to_dict()
+    assert 'oxygen_current' in cd.to_dict()
+
+
+def test_exporter_renders_once_per_snapshot(stokercloud_server):
+    clients = []
+    for name in ('boiler-1', 'boiler-2'):
+        client = Client(name, cache_time_seconds=60)
+        client.BASE_URL = stokercloud_server.base_url
+        clients.append(client)
+    clients.append(Client('offline', transport=UrllibTransport(timeout=1)))
+    clients[-1].BASE_URL = 'http://127.0.0.1:1/'
+
+    with Exporter(clients, interval=60) as exporter:
+        assert _wait_for(lambda: exporter.render().count(b'state="MOC"') == 2)
+        text = exporter.render().decode()
+    assert 'stokercloud_up{account="offline"} 0' in text
+    assert 'stokercloud_boiler_kwh{account="boiler-1",unit="kwh"} 3.8' in text
+    assert 'stokercloud_state{account="boiler-2",state="MOC"} 1' in text
+    # samples of one family are grouped under a single HELP/TYPE header
+    assert text.count('# TYPE stokercloud_boiler_kwh gauge') == 1
+    lines = text.splitlines()
+    kwh = [i for i, line in enumerate(lines) if line.startswith('stokercloud_boiler_kwh{')]
+    assert kwh == [kwh[0], kwh[0] + 1]
+
+    # a frozen clock keeps the snapshot age, and so the whole text, unchanged between scrapes
+    server = MetricsServer(('127.0.0.1', 0), Exporter(clients[:2], clock=FakeClock(), interval=60))
+    server.exporter.start()
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    try:
+        assert _wait_for(lambda: server.exporter.render().count(b'state="MOC"') == 2)
+        url = 'http://127.0.0.1:%d/metrics' % server.server_address[1]
+        first = urllib.request.urlopen(url).read()
+        assert urllib.request.urlopen(url).read() == first
+        assert server.exporter.render() is server.exporter.render()
+        assert b'stokercloud_oxygen_current{account="boiler-2",unit="pct"} 17.6' in first
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.exporter.stop()
+    assert len(_controller_requests(stokercloud_server)) == 2
+
+
+def test_exporter_scrapes_do_not_wait_for_polls(stokercloud_server):
+    release = threading.Event()
+
+    class HangingTransport:
+        def request(self, url, headers=None):
+            release.wait(5)
+            raise OSError("timed out")
+
+        def close(self):
+            pass
+
+    client = Client('boiler', cache_time_seconds=0)
+    client.BASE_URL = stokercloud_server.base_url
+    with Exporter([client, Client('hanging', transport=HangingTransport())], interval=60) as exporter:
+        assert _wait_for(lambda: b'account="boiler",unit="kwh"' in exporter.render())
+        start = timeit.default_timer()
+        text = exporter.render().decode()
+        assert timeit.default_timer() - start < 1
+        assert 'stokercloud_up{account="hanging"} 0' in text
+        release.set()
+
+
+def test_exporter_reports_failed_refresh_and_old_snapshots(stokercloud_server):
+    client = Client('boiler', cache_time_seconds=0)
+    client.BASE_URL = stokercloud_server.base_url
+    with Exporter([client], max_age=60, interval=0.05) as exporter:
+        assert _wait_for(lambda: b'stokercloud_up{account="boiler"} 1' in exporter.render())
+        assert b'stokercloud_snapshot_age_seconds{account="boiler"} 0' in exporter.render()
+
+        stokercloud_server.failures = 1000
+        assert _wait_for(lambda: b'stokercloud_up{account="boiler"} 0' in exporter.render())
+        assert b'stokercloud_boiler_kwh{account="boiler",unit="kwh"} 3.8' in exporter.render()
+
+        stokercloud_server.failures = 0
+        assert _wait_for(lambda: b'stokercloud_up{account="boiler"} 1' in exporter.render())
+
+    with Exporter([client], max_age=60, clock=lambda: client.last_fetch + 61, interval=60) as old:
+        assert _wait_for(lambda: b'stokercloud_snapshot_age_seconds' in old.render())
+        text = old.render().decode()
+    assert 'stokercloud_up{account="boiler"} 0' in text
+    assert 'stokercloud_snapshot_age_seconds{account="boiler"} 61' in text
+
+
+def test_histogram_buckets():
+    histogram = Histogram((0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value)
+    assert histogram.cumulative() == [(0.1, 2), (1, 3), (float('inf'), 4)]
+    assert histogram.sum == pytest.approx(3.65)
+
+
+def test_client_stats(stokercloud_server):
+    stats = ClientStats()
+    client = Client('boiler', cache_time_seconds=60, stats=stats)
+    client.BASE_URL = stokercloud_server.base_url
+    for _ in range(4):
+        client.controller_data()
+    assert stats.requests == 2
+    assert stats.token_refreshes == 1
+    assert (stats.cache_hits, stats.cache_misses) == (3, 1)
+    assert stats.cache_hit_rate == 0.75
+    # counted as transferred, gzip compressed
+    assert stats.bytes_received == stokercloud_server.bytes_sent
+    assert stats.latency['login'].count == stats.latency['request'].count == 1
+    assert stats.decode_time.count == 2
+    assert stats.as_dict()['latency']['request']['count'] == 1
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_client_retries_with_backoff(stokercloud_server):
+    clock = FakeClock()
+    client = Client('boiler', retry=RetryPolicy(attempts=3, sleep=clock.sleep))
+    client.BASE_URL = stokercloud_server.base_url
+    stokercloud_server.failures = 2
+    assert client.controller_data().serial_number == "12345"
+    assert len(clock.sleeps) == 2
+    assert clock.sleeps[1] <= 1.0
+
+    stokercloud_server.failures = 3
+    client.last_fetch = None
+    with pytest.raises(HTTPError):
+        client.controller_data()
+
+
+def test_circuit_breaker_counts_unexpected_errors():
+    class TruncatedTransport:
+        def request(self, url, headers=None):
+            raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+
+        def close(self):
+            pass
+
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    client = Client('boiler', transport=TruncatedTransport(), circuit_breaker=breaker,
+                    retry=RetryPolicy(attempts=3, sleep=clock.sleep))
+    with pytest.raises(EOFError):
+        client.request('http://127.0.0.1:1/')
+    # only network errors are retried
+    assert clock.sleeps == []
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 30
+    with pytest.raises(EOFError):
+        client.request('http://127.0.0.1:1/')
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_circuit_breaker_opens_and_recovers(stokercloud_server):
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    client = Client('boiler', cache_time_seconds=0, circuit_breaker=breaker)
+    client.BASE_URL = stokercloud_server.base_url
+    client.ensure_token()
+    stokercloud_server.failures = 2
+    for _ in range(2):
+        with pytest.raises(HTTPError):
+            client.controller_data()
+    with pytest.raises(CircuitOpen):
+        client.controller_data()
+    assert len(_controller_requests(stokercloud_server)) == 2
+
+    clock.now += 30
+    assert client.controller_data().serial_number == "12345"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_token_bucket_rate_limits():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock, sleep=clock.sleep)
+    for _ in range(6):
+        bucket.acquire()
+    # two burst tokens, then one every half second
+    assert clock.now == pytest.approx(2.0)
+    assert not bucket.try_acquire()
+
+
+def test_record_and_replay_transport(stokercloud_server, tmp_path):
+    directory = str(tmp_path)
+    client = Client('boiler', transport=RecordingTransport(HTTPTransport(), directory))
+    client.BASE_URL = stokercloud_server.base_url
+    recorded = client.controller_data().to_dict()
+    client.close()
+
+    replayed = Client('boiler', transport=ReplayTransport(directory))
+    replayed.BASE_URL = 'http://offline.invalid/'
+    assert replayed.controller_data().to_dict() == recorded
+
+    other = Client('someone-else', transport=ReplayTransport(directory))
+    with pytest.raises(HTTPError):
+        other.controller_data()
+    shared = Client('someone-else', transport=ReplayTransport(directory, ignore=('token', 'user')))
+    assert shared.controller_data().serial_number == "12345"
+
+
+@pytest.fixture(params=['array', 'numpy'])
+def batch_backend(request, monkeypatch):
+    if request.param == 'array':
+        monkeypatch.setattr('stokercloud.batch.numpy', None)
+    else:
+        monkeypatch.setattr('stokercloud.batch.numpy', pytest.importorskip('numpy'))
+    return request.param
+
+
+def test_snapshot_batch_columns_and_aggregates(batch_backend):
+    hopperdata = [item for item in sample_payload()['hopperdata'] if item['id'] != '3']
+    snapshots = [
+        ControllerData(sample_payload()),
+        ControllerData(sample_payload(miscdata=dict(sample_payload()['miscdata'], state={'value': 'lng_state_14'}))),
+        ControllerData(sample_payload(hopperdata=hopperdata)),
+    ]
+    batch = SnapshotBatch.from_snapshots(snapshots, labels=['a', 'b', 'c'])
+    assert len(batch) == 3
+    assert list(batch.column('oxygen_current')) == [17.6, 17.6, 17.6]
+    assert batch.unit('oxygen_current') == Unit.PERCENT
+    assert batch.mean('oxygen_current') == pytest.approx(17.6)
+    # the missing reading is skipped
+    assert batch.sum('consumption_day') == pytest.approx(55.4)
+    assert batch.max('consumption_day') == pytest.approx(27.7)
+    assert batch.min('consumption_day') == pytest.approx(27.7)
+    assert list(batch.state_codes()) == [STATES.index(State.MOC), STATES.index(State.WYLACZONY), STATES.index(State.MOC)]
+    assert batch.states() == [State.MOC, State.WYLACZONY, State.MOC]
+    assert batch.state_counts() == {State.MOC: 2, State.WYLACZONY: 1}
+    assert batch.labels == ['a', 'b', 'c']
+    streamed = SnapshotBatch.from_snapshots(cd for cd in snapshots)
+    assert len(streamed) == 3
+    assert streamed.labels == [None, None, None]
+    with pytest.raises(ValueError):
+        SnapshotBatch.from_snapshots(snapshots, labels=['a', 'b'])
+    with pytest.raises(ValueError):
+        SnapshotBatch.from_snapshots(snapshots[:1], labels=['a', 'b'])
+
+
+def test_archive_round_trip_and_append(tmp_path):
+    path = str(tmp_path / 'boiler.scar')
+    idle = ControllerData(sample_payload(miscdata=dict(sample_payload()['miscdata'], state={'value': 'lng_state_14'})))
+    with ArchiveWriter(path) as writer:
+        writer.append(ControllerData(sample_payload()), timestamp=1700000000.0)
+        writer.append(idle, timestamp=1700000010.5)
+    with ArchiveWriter(path) as writer:
+        writer.append(ControllerData(sample_payload(dhwdata=[])), timestamp=1700000020.0)
+        with pytest.raises(ValueError):
+            writer.append(idle, timestamp=1600000000.0)
+
+    with ArchiveReader(path) as reader:
+        assert len(reader) == 3
+        assert list(reader.timestamps()) == [1700000000.0, 1700000010.5, 1700000020.0]
+        assert list(reader.column('boiler_kwh')) == pytest.approx([3.8] * 3)
+        assert reader.state_column() == [State.MOC, State.WYLACZONY, State.MOC]
+        records = list(reader.records())
+    assert records[2][2]['dhw_difference_under'] is None
+    assert records[0][2]['consumption_total'] == 1499.0
+    with pytest.raises(ValueError):
+        ArchiveWriter(path, fields=['boiler_kwh'])
+
+
+def test_archive_recovers_torn_tail_and_interns_states(tmp_path):
+    path = str(tmp_path / 'boiler.scar')
+    custom = ControllerData(sample_payload(miscdata=dict(sample_payload()['miscdata'], state={'value': 'lng_state_99'})))
+    with ArchiveWriter(path) as writer:
+        writer.append(custom, timestamp=1000.0)
+        writer.append(ControllerData(sample_payload()), timestamp=1010.0)
+    # a crash in the middle of writing the last record
+    with open(path, 'r+b') as fh:
+        fh.truncate(os.path.getsize(path) - 7)
+    with ArchiveWriter(path) as writer:
+        for timestamp in (1020.0, 1030.0, 1040.0):
+            writer.append(custom if timestamp == 1040.0 else ControllerData(sample_payload()), timestamp=timestamp)
+
+    with ArchiveReader(path) as reader:
+        assert list(reader.timestamps()) == [1000.0, 1020.0, 1030.0, 1040.0]
+        assert reader.state_column() == ['lng_state_99', State.MOC, State.MOC, 'lng_state_99']
+        assert reader.states.count('lng_state_99') == 1
+        # stored as float32
+        assert list(reader.column('boiler_kwh')) == pytest.approx([3.8] * 4)
+
+
+def test_archive_long_gaps_and_empty_archive(tmp_path):
+    path = str(tmp_path / 'boiler.scar')
+    with ArchiveWriter(path) as writer:
+        writer.flush()
+        with ArchiveReader(path) as reader:
+            assert len(reader) == 0
+            assert reader.last_ms is None
+        writer.append(ControllerData(sample_payload()), timestamp=1700000000.0)
+    sixty_days = 60 * 24 * 3600
+    with ArchiveWriter(path) as writer:
+        writer.append(ControllerData(sample_payload()), timestamp=1700000000.0 + sixty_days)
+    with ArchiveReader(path) as reader:
+        assert list(reader.timestamps()) == [1700000000.0, 1700000000.0 + sixty_days]
+        assert reader.last_ms == (1700000000 + sixty_days) * 1000
+
+
+def test_controller_data_memoizes_values():
+    cd = ControllerData(sample_payload())
+    assert cd.boiler_temperature_current is cd.boiler_temperature_current
+    record = cd.to_dict()
+    record['boiler_kwh'] = 0
+    assert cd.to_dict()['boiler_kwh'] == 3.8
+    assert cd.state == 'MOC'
+    unknown = ControllerData(sample_payload(miscdata=dict(sample_payload()['miscdata'], state={'value': 'x'})))
+    assert unknown.state is None
+
+
+def _with_state(value, alarm=0):
+    return sample_payload(miscdata=dict(sample_payload()['miscdata'], state={'value': value}, alarm=alarm))
+
+
+def test_adaptive_interval():
+    interval = AdaptiveInterval(normal=30, fast=5, slow=300)
+    assert interval(None) == 30
+    assert interval(ControllerData(sample_payload())) == 30
+    assert interval(ControllerData(_with_state('lng_state_2'))) == 5
+    assert interval(ControllerData(_with_state('lng_state_5', alarm=1))) == 5
+    assert interval(ControllerData(_with_state('lng_state_14'))) == 300
+    assert interval(ControllerData(_with_state('lng_state_23'))) == 300
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = timeit.default_timer() + timeout
+    while not predicate() and timeit.default_timer() < deadline:
+        threading.Event().wait(0.01)
+    return predicate()
+
+
+def test_client_subscriptions_share_one_poll_loop(stokercloud_server):
+    client = Client('boiler')
+    client.BASE_URL = stokercloud_server.base_url
+    client.subscriptions.interval = lambda cd: 0.01
+    snapshots, changes = [], []
+    first = client.subscribe(snapshots.append)
+    second = client.subscribe(changes.append, changes_only=True)
+    assert _wait_for(lambda: len(snapshots) >= 3)
+    payload = sample_payload()
+    for item in payload['frontdata']:
+        if item['id'] == 'boilertemp':
+            item['value'] = '65.5'
+    stokercloud_server.payload = payload
+    assert _wait_for(lambda: len(changes) >= 2)
+    first.cancel()
+    second.cancel()
+    assert client.subscriptions._thread is None
+    # the first change set is the whole record, later ones only what moved
+    assert 'boiler_kwh' in changes[0]
+    assert changes[1] == {'boiler_temperature_current': 65.5}
+    assert all(isinstance(cd, ControllerData) for cd in snapshots)
+    assert len(_logins(stokercloud_server)) == 1
+    client.close()
+
+
+def test_client_stream(stokercloud_server):
+    client = Client('boiler')
+    client.BASE_URL = stokercloud_server.base_url
+    client.subscriptions.interval = lambda cd: 0.01
+
+    async def collect():
+        received = []
+        async for cd in client.stream():
+            received.append(cd)
+            if len(received) == 2:
+                break
+        return received
+
+    received = asyncio.run(collect())
+    assert [cd.state for cd in received] == ['MOC', 'MOC']
+    assert _wait_for(lambda: client.subscriptions._thread is None)
+    client.close()
+
+
+def test_client_stream_drops_oldest_for_slow_consumer(stokercloud_server):
+    client = Client('boiler')
+    client.BASE_URL = stokercloud_server.base_url
+    client.subscriptions.interval = lambda cd: 0.01
+
+    async def collect():
+        stream = client.stream(max_pending=2)
+        await stream.__anext__()
+        # a consumer busy elsewhere while the poll loop keeps going
+        assert _wait_for(lambda: len(_controller_requests(stokercloud_server)) >= 6)
+        client.subscriptions.interval = lambda cd: 60
+        threading.Event().wait(0.2)
+        await asyncio.sleep(0.05)
+        pending = [await stream.__anext__(), await stream.__anext__()]
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(stream.__anext__(), 0.2)
+        return pending
+
+    assert len(asyncio.run(collect())) == 2
+    client.close()
+
+
+@pytest.mark.parametrize('etags', [True, False])
+def test_unchanged_payload_reuses_snapshot(stokercloud_server, etags):
+    stokercloud_server.etags = etags
+    stats = ClientStats()
+    client = Client('boiler', cache_time_seconds=0, stats=stats)
+    client.BASE_URL = stokercloud_server.base_url
+    first = client.controller_data()
+    second = client.controller_data()
+    assert second is first
+    assert stats.decode_time.count == 2  # login and the first payload
+    stokercloud_server.payload = _with_state('lng_state_14')
+    third = client.controller_data()
+    assert third is not first
+    assert third.state == 'WYLACZONY'
+    assert client.controller_data() is third
+    client.close()
+
+
+@pytest.mark.parametrize('transport', [HTTPTransport, UrllibTransport])
+def test_transports_decompress_gzip(stokercloud_server, transport):
+    url = stokercloud_server.base_url + 'v16bckbeta/dataout2/controllerdata2.php?token=x'
+    plain = transport().request(url)
+    compressed = transport().request(url, {'Accept-Encoding': 'gzip'})
+    assert compressed.body == plain.body
+    assert 'content-encoding' not in compressed.headers
+    assert compressed.wire_size < plain.wire_size == len(plain.body)
+    # a repetitive JSON payload compresses well
+    assert stokercloud_server.bytes_sent < len(plain.body) * 1.5
+
+
+def test_parse_record():
+    record = parse_record(json.dumps(sample_payload()).encode())
+    assert record['boiler_kwh'] == 3.8
+    assert record['state'] == 'MOC'
+    assert (record['alarm'], record['running']) == (0, 1)
+    assert pickle.loads(pickle.dumps(record)) == record
+    assert parse_record(json.dumps(sample_payload(notconnected=1)).encode()) is None
+    with pytest.raises(TokenInvalid):
+        parse_record(b'{"error": "invalid token"}')
+
+
+def test_ingest_pipeline(stokercloud_server):
+    clients = [Client('boiler-%d' % i) for i in range(3)]
+    for client in clients:
+        client.BASE_URL = stokercloud_server.base_url
+    with IngestPipeline(clients, io_workers=2, processes=2) as pipeline:
+        records = pipeline.poll()
+        assert sorted(records) == ['boiler-0', 'boiler-1', 'boiler-2']
+        assert all(record['consumption_total'] == 1499.0 for record in records.values())
+        stokercloud_server.failures = 1
+        records = pipeline.poll()
+    assert sum(isinstance(record, HTTPError) for record in records.values()) == 1
+
+
+
+def test_ingest_pipeline_relogs_in_the_io_threads(stokercloud_server):
+    clients = [Client('boiler-%d' % i) for i in range(2)]
+    for client in clients:
+        client.BASE_URL = stokercloud_server.base_url
+    with IngestPipeline(clients, io_workers=2, processes=1) as pipeline:
+        stokercloud_server.payload = {"error": "invalid token"}
+        records = pipeline.poll()
+        assert all(isinstance(record, TokenInvalid) for record in records.values())
+        assert len(_logins(stokercloud_server)) == 2
+
+        def refresh_token():
+            raise OSError("login failed")
+
+        clients[0].refresh_token = refresh_token
+        stokercloud_server.payload = sample_payload()
+        records = pipeline.poll()
+    assert isinstance(records['boiler-0'], OSError)
+    assert records['boiler-1']['state'] == 'MOC'
+    assert len(_logins(stokercloud_server)) == 3
+
+
+def _shared_cache_state(base_url, directory):
+    client = Client('boiler', cache=SharedCache(directory))
+    client.BASE_URL = base_url
+    return client.controller_data().state
+
+
+def test_shared_cache_fetches_once_across_processes(stokercloud_server, tmp_path):
+    directory = str(tmp_path / 'cache')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=3) as executor:
+        states = list(executor.map(_shared_cache_state, [stokercloud_server.base_url] * 3, [directory] * 3))
+    assert states == ['MOC'] * 3
+    assert len(_controller_requests(stokercloud_server)) == 1
+
+    cache = SharedCache(directory)
+    client = Client('boiler', cache=cache)
+    client.BASE_URL = stokercloud_server.base_url
+    assert client.controller_data().state == 'MOC'
+    assert len(_controller_requests(stokercloud_server)) == 1
+    assert client.token is None  # never even logged in
+
+    fetched, body = cache.get('boiler')
+    cache.set('boiler', body, fetched - 60)
+    client.last_fetch = None
+    client.controller_data()
+    assert len(_controller_requests(stokercloud_server)) == 2
+    assert cache.get('boiler')[0] > fetched
+
+
+def test_derived_metrics():
+    metrics = DerivedMetrics(half_life=3600)
+    first = metrics.update(ControllerData(_hopper_payload(120, 27.7)), timestamp=0)
+    assert first['burn_rate'] is None and first['hours_to_empty'] is None
+    assert first['heat_output'] == pytest.approx(3.0 + 4 / 90 * 17)
+    assert first['oxygen_deviation'] == pytest.approx(17.6 - 20.9)
+
+    metrics.update(ControllerData(_hopper_payload(119, 28.7)), timestamp=3600)
+    assert metrics.burn_rate == pytest.approx(1.0)
+    assert metrics.hours_to_empty == pytest.approx(119)
+    # the daily counter reset at midnight: 0.5 kg in half an hour is still 1 kg/h
+    metrics.update(ControllerData(_hopper_payload(118.5, 0.5)), timestamp=5400)
+    assert metrics.burn_rate == pytest.approx(1.0)
+    metrics.update(ControllerData(_hopper_payload(116.5, 2.5)), timestamp=9000)
+    assert 1.0 < metrics.burn_rate < 2.0
+    assert metrics.efficiency == pytest.approx(metrics.mean_heat_output / (metrics.burn_rate * 4.8))
+    # an out of order sample is ignored
+    assert metrics.update(ControllerData(_hopper_payload(0, 0)), timestamp=10) == metrics.values()
+    assert metrics.hopper_content == 116.5
+
+
+def test_ewma_half_life():
+    average = EWMA(half_life=60)
+    average.update(0.0, 0)
+    assert average.update(10.0, 60) == pytest.approx(5.0)
+
+
+def test_rule_parsing():
+    rule = Rule.parse('smoke_temperature > 250 for 5 min')
+    assert (rule.field, rule.op, rule.threshold, rule.duration) == ('smoke_temperature', '>', 250.0, 300)
+    rule = Rule.parse('hopper_content < 20 kg')
+    assert (rule.threshold, rule.duration, rule.name) == (20.0, 0, 'hopper_content < 20 kg')
+    assert Rule.parse('state == BLAD_ROZPAL').threshold == 'BLAD_ROZPAL'
+    assert Rule.parse('boiler_kwh>=3 for 30s').duration == 30
+    # thresholds are converted to the unit of the field
+    assert Rule.parse('auger_capacity < 2 kg').threshold == 2000.0
+    assert Rule.parse('auger_capacity < 1300 g for 1 min').threshold == 1300.0
+    # common spellings of the field units, also attached to the value
+    assert Rule.parse('oxygen_current < 5 %').threshold == 5.0
+    assert Rule.parse('oxygen_current < 5% for 1 min').duration == 60
+    assert Rule.parse('smoke_temperature > 250 C').threshold == 250.0
+    assert Rule.parse('smoke_temperature > 250°C for 5 min').threshold == 250.0
+    assert Rule.parse('hopper_content < 20kg').threshold == 20.0
+    assert Rule.parse('auger_capacity < 1.3kg').threshold == 1300.0
+    assert Rule.parse('boiler_kwh > 10 kW').threshold == 10.0
+    assert Rule.parse('pressure < -20 Pa').threshold == -20.0
+    for text in ['smoke > 250', 'state > MOC', 'state == NOPE', 'boiler_kwh ~ 3', 'hopper_content < 20 lbs',
+                 'state == MOC kg', 'smoke_temperature > 250%', 'oxygen_current < 5 kW']:
+        with pytest.raises(ValueError):
+            Rule.parse(text)
+
+
+def test_alert_plan():
+    plan = AlertPlan([
+        'smoke_temperature > 250 for 5m',
+        'smoke_temperature > 100',
+        'state == BLAD_ROZPAL',
+        'hopper_content < 20 kg',
+    ])
+    assert [len(checks) for checks in plan.checks.values()] == [2, 1, 1]
+    state = plan.state()
+    hot = _with_smoke_temperature(300)
+    assert state.evaluate(hot, timestamp=0) == [(plan.rules[1], True)]
+    assert state.evaluate(hot, timestamp=200) == []
+    assert state.evaluate(hot, timestamp=300) == [(plan.rules[0], True)]
+    assert state.firing == plan.rules[:2]
+    failed = ControllerData(_with_state('lng_state_13'))
+    assert state.evaluate(failed, timestamp=310) == [(plan.rules[0], False), (plan.rules[2], True)]
+    assert state.firing == plan.rules[1:3]
+    # every boiler gets its own state from the shared plan
+    other = plan.state()
+    transitions = other.evaluate(ControllerData(_hopper_payload(10, 1)), timestamp=0)
+    assert transitions == [(plan.rules[1], True), (plan.rules[3], True)]
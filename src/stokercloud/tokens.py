@@ -0,0 +1,48 @@
+import json
+import threading
+from stokercloud.files import atomic_write, file_lock
+
+
+class TokenCache:
+    """Login tokens persisted in a JSON file, keyed by account name.
+
+    Lets a restarted process reuse the tokens it had instead of logging every
+    account in again. Writes go to a temporary file which is then renamed over
+    the cache, so readers never see a partially written file, and updates hold
+    an flock on `path` + '.lock' so processes sharing the file keep each
+    other's entries.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, entries):
+        atomic_write(self.path, json.dumps(entries).encode('utf-8'))
+
+    def get(self, name):
+        """Return (token, credentials, issued_at) or None."""
+        entry = self._read().get(name)
+        if entry is None:
+            return None
+        return entry['token'], entry['credentials'], entry['issued']
+
+    def set(self, name, token, credentials, issued):
+        with self._lock, file_lock(self.lock_path):
+            entries = self._read()
+            entries[name] = {'token': token, 'credentials': credentials, 'issued': issued}
+            self._write(entries)
+
+    def discard(self, name):
+        with self._lock, file_lock(self.lock_path):
+            entries = self._read()
+            if entries.pop(name, None) is not None:
+                self._write(entries)
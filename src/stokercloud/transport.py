@@ -0,0 +1,207 @@
+import base64
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import threading
+from urllib import request
+from urllib.error import HTTPError as UrllibHTTPError
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 10  # as urllib
+
+
+def redact(url):
+    """`url` without its token parameter, safe to log."""
+    parts = urlsplit(url)
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != 'token'])
+    return parts._replace(query=query).geturl()
+
+
+class HTTPError(Exception):
+    def __init__(self, status, url):
+        url = redact(url)
+        super().__init__("HTTP %s for %s" % (status, url))
+        self.status = status
+        self.url = url
+
+
+class Response:
+    __slots__ = ('status', 'headers', 'body', 'wire_size')
+
+    def __init__(self, status, headers, body, wire_size=None):
+        self.status = status
+        self.headers = headers  # lower-cased header names
+        self.body = body
+        # bytes as transferred, before a gzip Content-Encoding was undone
+        self.wire_size = len(body) if wire_size is None else wire_size
+
+    def raise_for_status(self, url):
+        if self.status >= 400:
+            raise HTTPError(self.status, url)
+
+
+def make_response(status, headers, body):
+    """Build a Response, undoing a gzip Content-Encoding."""
+    headers = {k.lower(): v for k, v in headers}
+    wire_size = len(body)
+    if headers.get('content-encoding') == 'gzip' and body:
+        body = gzip.decompress(body)
+        del headers['content-encoding']
+    return Response(status, headers, body, wire_size)
+
+
+class UrllibTransport:
+    """One connection per request through urllib, the original behaviour."""
+
+    def __init__(self, timeout: float = 30):
+        self.timeout = timeout
+
+    def request(self, url, headers=None):
+        req = request.Request(url, headers=headers or {})
+        try:
+            with request.urlopen(req, timeout=self.timeout) as response:
+                return make_response(response.status, response.getheaders(), response.read())
+        except UrllibHTTPError as e:
+            return make_response(e.code, e.headers.items(), e.read())
+
+    def close(self):
+        pass
+
+
+class HTTPTransport:
+    """Persistent keep-alive connections, one per host.
+
+    A socket the server has closed while idle is detected on the next request,
+    which is then retried once on a fresh connection. Redirects are followed
+    like urllib does, up to MAX_REDIRECTS.
+    """
+    STALE_ERRORS = (
+        http.client.RemoteDisconnected,
+        http.client.CannotSendRequest,
+        http.client.BadStatusLine,
+        ConnectionResetError,
+        BrokenPipeError,
+    )
+
+    def __init__(self, timeout: float = 30):
+        self.timeout = timeout
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def _connection(self, scheme, netloc):
+        conn = self._connections.get((scheme, netloc))
+        if conn is None:
+            cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            conn = self._connections[(scheme, netloc)] = cls(netloc, timeout=self.timeout)
+        return conn
+
+    def _drop(self, scheme, netloc):
+        conn = self._connections.pop((scheme, netloc), None)
+        if conn is not None:
+            conn.close()
+
+    def request(self, url, headers=None):
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self._request(url, headers)
+            if response.status not in REDIRECT_STATUSES or 'location' not in response.headers:
+                return response
+            url = urljoin(url, response.headers['location'])
+        raise HTTPError(response.status, url)
+
+    def _request(self, url, headers):
+        parts = urlsplit(url)
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+        with self._lock:
+            for attempt in (1, 2):
+                conn = self._connection(parts.scheme, parts.netloc)
+                try:
+                    conn.request('GET', target, headers=headers or {})
+                    response = conn.getresponse()
+                    body = response.read()
+                except self.STALE_ERRORS:
+                    self._drop(parts.scheme, parts.netloc)
+                    if attempt == 2:
+                        raise
+                    continue
+                except Exception:
+                    self._drop(parts.scheme, parts.netloc)
+                    raise
+                if response.will_close:
+                    self._drop(parts.scheme, parts.netloc)
+                return make_response(response.status, response.getheaders(), body)
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+
+
+def strip_params(url, ignore=('token',)):
+    parts = urlsplit(url)
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in ignore])
+    return '%s?%s' % (parts.path, query)
+
+
+def recording_key(url, ignore=('token',)):
+    """File name of a recorded response: the path and query without the token."""
+    return hashlib.sha1(strip_params(url, ignore).encode('utf-8')).hexdigest() + '.json'
+
+
+class RecordingTransport:
+    """Forward requests to `transport` and store every response in `directory`."""
+
+    def __init__(self, transport, directory):
+        self.transport = transport
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def request(self, url, headers=None):
+        response = self.transport.request(url, headers)
+        with open(os.path.join(self.directory, recording_key(url)), 'w', encoding='utf-8') as fh:
+            json.dump({
+                'url': strip_params(url),
+                'status': response.status,
+                'headers': response.headers,
+                'body': base64.b64encode(response.body).decode('ascii'),
+            }, fh)
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class ReplayTransport:
+    """Answer requests from responses stored by RecordingTransport, offline.
+
+    Query parameters in `ignore` are left out when matching: by default the
+    token, so a recording replays for any later login. Add 'user' to replay
+    one account's recording for every account. Unknown requests get a 404.
+    """
+
+    def __init__(self, directory, ignore=('token',)):
+        self.directory = directory
+        self.ignore = tuple(ignore)
+        self._responses = {}
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.json'):
+                continue
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as fh:
+                entry = json.load(fh)
+            self._responses[recording_key(entry['url'], self.ignore)] = Response(
+                entry['status'], entry['headers'], base64.b64decode(entry['body'])
+            )
+
+    def request(self, url, headers=None):
+        response = self._responses.get(recording_key(url, self.ignore))
+        if response is None:
+            return Response(404, {}, b'')
+        return response
+
+    def close(self):
+        pass